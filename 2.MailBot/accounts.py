@@ -0,0 +1,153 @@
+import asyncio
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlparse, parse_qs
+
+import db_manager
+from async_service import AsyncGmailService, GMAIL_WORKERS
+from gmail_service import GmailService, SCOPES
+
+# Скільки клієнтів Gmail тримаємо в пам'яті одночасно
+POOL_SIZE = int(os.environ.get("GMAIL_POOL_SIZE", 50))
+# Токени, що спливають раніше, оновлюються фоновою задачею, а не під час запиту користувача
+REFRESH_MARGIN = timedelta(minutes=10)
+# Ключ акаунта з token.json (режим одного користувача, як до появи /login)
+LEGACY_ACCOUNT = 'me'
+
+CLIENT_SECRETS_FILE = 'credentials.json'
+# Для OAuth-клієнта типу "installed" Google дозволяє лише loopback-адресу
+OAUTH_REDIRECT_URI = os.environ.get("OAUTH_REDIRECT_URI", "http://localhost")
+
+
+class GmailPool:
+    """
+    Обмежений пул клієнтів Gmail для чатів з витісненням за LRU.
+    Усі клієнти працюють через спільний пул потоків, тому пам'ять не росте з кількістю акаунтів.
+    Чат без власного токена отримує спільний акаунт з token.json (якщо він є).
+    """
+
+    def __init__(self, cache=None, max_size=POOL_SIZE, max_workers=GMAIL_WORKERS):
+        self.cache = cache
+        self.max_size = max_size
+        self._clients = OrderedDict()
+        self._pending = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gmail')
+        self._legacy = None
+        self._legacy_failed = False
+        self._legacy_lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self._clients)
+
+    async def get(self, chat_id):
+        """Повертає AsyncGmailService чату або None, якщо доступу до пошти немає."""
+        client = self._clients.get(chat_id)
+        if client is not None:
+            self._clients.move_to_end(chat_id)
+            return client
+
+        # Паралельні запити одного чату чекають на одне й те саме створення клієнта
+        task = self._pending.get(chat_id)
+        if task is None:
+            task = asyncio.ensure_future(self._load(chat_id))
+            self._pending[chat_id] = task
+            task.add_done_callback(lambda _: self._pending.pop(chat_id, None))
+        return await task
+
+    async def _load(self, chat_id):
+        loop = asyncio.get_running_loop()
+        token_json = await loop.run_in_executor(self._executor, db_manager.get_account_token, chat_id)
+        if not token_json:
+            return await self.get_legacy()
+
+        try:
+            service = await loop.run_in_executor(
+                self._executor, lambda: GmailService(cache=self.cache, token_json=token_json, account=str(chat_id)))
+        except Exception as e:
+            print(f"Помилка авторизації чату {chat_id}: {e}")
+            return None
+
+        client = AsyncGmailService(service, self._executor, account=str(chat_id))
+        self._clients[chat_id] = client
+        while len(self._clients) > self.max_size:
+            self._clients.popitem(last=False)
+        return client
+
+    async def account_key(self, chat_id):
+        """
+        Ключ акаунта чату в локальній БД без створення клієнта Gmail (і без мережі):
+        для офлайн-операцій, як-от пошук по збережених листах.
+        """
+        client = self._clients.get(chat_id)
+        if client is not None:
+            return client.account
+        loop = asyncio.get_running_loop()
+        token_json = await loop.run_in_executor(self._executor, db_manager.get_account_token, chat_id)
+        return str(chat_id) if token_json else LEGACY_ACCOUNT
+
+    async def get_legacy(self):
+        """Спільний клієнт з token.json; створюється один раз."""
+        if self._legacy is not None or self._legacy_failed:
+            return self._legacy
+
+        async with self._legacy_lock:
+            if self._legacy is None and not self._legacy_failed:
+                loop = asyncio.get_running_loop()
+                try:
+                    service = await loop.run_in_executor(self._executor, lambda: GmailService(cache=self.cache, account=LEGACY_ACCOUNT))
+                    self._legacy = AsyncGmailService(service, self._executor, account=LEGACY_ACCOUNT)
+                except Exception as e:
+                    print(f"Помилка ініціалізації сервісу: {e}")
+                    self._legacy_failed = True
+        return self._legacy
+
+    def evict(self, chat_id):
+        self._clients.pop(chat_id, None)
+
+    async def refresh_expiring(self, margin=REFRESH_MARGIN):
+        """Завчасно оновлює токени клієнтів у пулі і зберігає нові токени в БД."""
+        loop = asyncio.get_running_loop()
+        for chat_id, client in list(self._clients.items()):
+            try:
+                if await client.refresh_if_expiring(margin):
+                    await loop.run_in_executor(self._executor, db_manager.save_account,
+                                               chat_id, client.service.token_json())
+            except Exception as e:
+                print(f"Помилка оновлення токена чату {chat_id}: {e}")
+
+        if self._legacy is not None:
+            try:
+                await self._legacy.refresh_if_expiring(margin)
+            except Exception as e:
+                print(f"Помилка оновлення токена: {e}")
+
+
+def create_login_flow():
+    """Створює OAuth-flow для входу користувача; повертає (flow, url для браузера, state)."""
+    from google_auth_oauthlib.flow import Flow
+
+    flow = Flow.from_client_secrets_file(CLIENT_SECRETS_FILE, SCOPES, redirect_uri=OAUTH_REDIRECT_URI)
+    # offline + consent гарантують refresh_token для фонового оновлення
+    url, state = flow.authorization_url(access_type='offline', prompt='consent')
+    return flow, url, state
+
+
+def finish_login(flow, state, redirect_url):
+    """
+    Обмінює код з адреси, на яку Google перенаправив браузер, на токен.
+    Повертає (token_json, email). Виконується в пулі потоків.
+    """
+    params = parse_qs(urlparse(redirect_url.strip()).query)
+    if 'error' in params:
+        raise ValueError(params['error'][0])
+    if 'code' not in params:
+        raise ValueError("У посиланні немає коду авторизації.")
+    if params.get('state', [None])[0] != state:
+        raise ValueError("Посилання не відповідає останньому запиту /login.")
+
+    flow.fetch_token(code=params['code'][0])
+    token_json = flow.credentials.to_json()
+    email = GmailService(token_json=token_json).get_email_address()
+    return token_json, email
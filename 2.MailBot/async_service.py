@@ -0,0 +1,81 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import db_manager
+
+# Скільки запитів до Gmail API може виконуватися одночасно
+GMAIL_WORKERS = 8
+# SQLite краще працює з одним записувачем, тому звернення до БД йдуть по черзі
+DB_WORKERS = 1
+
+
+class AsyncGmailService:
+    """
+    Асинхронна обгортка над GmailService.
+    Блокуючі виклики виконуються в обмеженому пулі потоків і не зупиняють event loop бота.
+    """
+
+    def __init__(self, service, executor=None, account='me'):
+        self.service = service
+        # Ключ акаунта в локальній БД (emails.account, sync_state.account)
+        self.account = account
+        # Пул потоків може бути спільним для багатьох акаунтів (див. accounts.GmailPool)
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=GMAIL_WORKERS, thread_name_prefix='gmail')
+
+    @property
+    def request_count(self):
+        """Скільки запитів до Gmail API зробив цей клієнт (для лімітів на кількість викликів)."""
+        return self.service.request_count
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def send_message(self, recipient, subject, message_text, message_id=None):
+        return await self._run(self.service.send_message, recipient, subject, message_text, message_id)
+
+    async def find_sent_message(self, message_id):
+        return await self._run(self.service.find_sent_message, message_id)
+
+    async def get_latest_emails(self, count=5):
+        return await self._run(self.service.get_latest_emails, count)
+
+    async def list_page(self, label='INBOX', count=5, page_token=None):
+        return await self._run(self.service.list_page, label, count, page_token)
+
+    async def sync_changes(self, history_id=None, label='INBOX', count=5):
+        return await self._run(self.service.sync_changes, history_id, label, count)
+
+    async def get_full_message_text(self, msg_id):
+        return await self._run(self.service.get_full_message_text, msg_id)
+
+    async def refresh_if_expiring(self, margin):
+        return await self._run(self.service.refresh_if_expiring, margin)
+
+    def close(self):
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+
+class AsyncDB:
+    """
+    Асинхронний фасад для db_manager: db.get_emails_page(...) повертає корутину,
+    а сама функція виконується в окремому потоці.
+    """
+
+    def __init__(self, max_workers=DB_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db')
+
+    def __getattr__(self, name):
+        func = getattr(db_manager, name)
+
+        async def wrapper(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+        return wrapper
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -1,38 +1,474 @@
+import re
 import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime
+from functools import lru_cache
+
+import metrics
 
 # На Render (Free Tier) цей файл буде видалятися при кожному перезапуску (deploy).
 # Для курсової роботи це нормально. Для реального продукту потрібен PostgreSQL.
 DB_NAME = "emails.db"
 
+# Одне довготривале з'єднання на процес; доступ до нього серіалізується блокуванням
+_conn = None
+_lock = threading.RLock()
+
+_TABLE_RE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE|TRIGGER|INDEX)\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)', re.IGNORECASE)
+
+
+@lru_cache(maxsize=256)
+def _statement_label(sql):
+    """Мітка запиту для метрик: команда і головна таблиця, напр. 'SELECT emails'."""
+    words = sql.split(None, 1)
+    if not words:
+        return 'OTHER'
+    match = _TABLE_RE.search(sql)
+    return f"{words[0].upper()} {match.group(1)}" if match else words[0].upper()
+
+
+class _TimedConnection(sqlite3.Connection):
+    """З'єднання, що записує тривалість кожного запиту в гістограму db_statement_seconds."""
+
+    def execute(self, sql, *args):
+        with metrics.track('db_statement_seconds', statement=_statement_label(sql)):
+            return super().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        with metrics.track('db_statement_seconds', statement=_statement_label(sql)):
+            return super().executemany(sql, *args)
+
+
+def get_connection():
+    """
+    Повертає спільне з'єднання з БД. Воно створюється при першому зверненні (режим WAL),
+    тоді ж створюється і схема, тож старт бота не чекає на БД.
+    """
+    global _conn
+    with _lock:
+        if _conn is None:
+            conn = sqlite3.connect(DB_NAME, check_same_thread=False, timeout=30, factory=_TimedConnection)
+            # WAL: читання не блокують запис, а commit не робить fsync основного файлу
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            try:
+                _create_schema(conn)
+                conn.commit()
+            except Exception:
+                conn.close()
+                raise
+            _conn = conn
+        return _conn
+
+
+@contextmanager
+def transaction():
+    """Виконує блок в одній транзакції: commit при успіху, rollback при помилці."""
+    with _lock:
+        conn = get_connection()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+# executescript() робить неявний COMMIT, тому тригери створюються окремими запитами в межах транзакції
+_FTS_TRIGGERS = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS emails_fts_ai AFTER INSERT ON emails BEGIN
+        INSERT INTO emails_fts (rowid, subject, sender, body)
+        VALUES (new.id, new.subject, new.sender, new.body);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS emails_fts_ad AFTER DELETE ON emails BEGIN
+        INSERT INTO emails_fts (emails_fts, rowid, subject, sender, body)
+        VALUES ('delete', old.id, old.subject, old.sender, old.body);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS emails_fts_au AFTER UPDATE ON emails BEGIN
+        INSERT INTO emails_fts (emails_fts, rowid, subject, sender, body)
+        VALUES ('delete', old.id, old.subject, old.sender, old.body);
+        INSERT INTO emails_fts (rowid, subject, sender, body)
+        VALUES (new.id, new.subject, new.sender, new.body);
+    END
+    ''',
+]
+
+
+def close_db():
+    global _conn
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+
+
+def _db_date(value):
+    # Рядок фіксованої ширини: лексикографічний порядок збігається з хронологічним
+    return (value or datetime.now()).strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
 def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS emails (
+    """Відкриває БД і створює таблиці, якщо їх ще немає."""
+    get_connection()
+
+
+# Одна й та сама скринька може бути підключена до кількох акаунтів, тому gmail_id унікальний у межах акаунта
+_EMAILS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        gmail_id TEXT,
+        sender TEXT,
+        recipient TEXT,
+        subject TEXT,
+        body TEXT,
+        folder TEXT,
+        received_date TIMESTAMP,
+        account TEXT DEFAULT 'me',
+        UNIQUE (account, gmail_id)
+    )
+'''
+_EMAILS_COLUMNS = 'id, gmail_id, sender, recipient, subject, body, folder, received_date, account'
+
+
+def _has_global_gmail_id_unique(conn):
+    for _, name, unique, *_ in conn.execute("PRAGMA index_list(emails)").fetchall():
+        columns = [row[2] for row in conn.execute(f'PRAGMA index_info("{name}")')]
+        if unique and columns == ['gmail_id']:
+            return True
+    return False
+
+
+def _create_schema(conn):
+    conn.execute(_EMAILS_TABLE.format(name='emails'))
+    # Старі бази створені без колонки account
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(emails)")]
+    if 'account' not in columns:
+        conn.execute("ALTER TABLE emails ADD COLUMN account TEXT DEFAULT 'me'")
+
+    # Старі бази мають UNIQUE(gmail_id) на всю таблицю. SQLite не змінює обмеження,
+    # тому таблицю перебудовуємо; id зберігаються, тож індекс FTS лишається дійсним
+    if _has_global_gmail_id_unique(conn):
+        conn.execute(_EMAILS_TABLE.format(name='emails_migrated'))
+        conn.execute(f"INSERT INTO emails_migrated ({_EMAILS_COLUMNS}) SELECT {_EMAILS_COLUMNS} FROM emails")
+        conn.execute("DROP TABLE emails")
+        conn.execute("ALTER TABLE emails_migrated RENAME TO emails")
+
+    # (account, gmail_id) проіндексовано через UNIQUE; цей індекс обслуговує вибірку папки за датою
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_emails_folder_date
+        ON emails (account, folder, received_date DESC, id DESC)
+    ''')
+
+    # Повнотекстовий індекс (FTS5) поверх emails, синхронізується тригерами
+    fts_exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'emails_fts'").fetchone()
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS emails_fts
+        USING fts5(subject, sender, body, content='emails', content_rowid='id')
+    ''')
+    for trigger in _FTS_TRIGGERS:
+        conn.execute(trigger)
+    if not fts_exists:
+        # Індексуємо листи, збережені до появи FTS
+        conn.execute("INSERT INTO emails_fts (emails_fts) VALUES ('rebuild')")
+
+    # Повний текст прочитаних листів (другий рівень MessageCache), окремо для кожного акаунта.
+    # Стара таблиця без account — лише кеш, тож її можна просто створити заново
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(message_bodies)")]
+    if columns and 'account' not in columns:
+        conn.execute("DROP TABLE message_bodies")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS message_bodies (
+            account TEXT,
+            gmail_id TEXT,
+            body TEXT,
+            cached_at TIMESTAMP,
+            PRIMARY KEY (account, gmail_id)
+        )
+    ''')
+
+    # OAuth-токени користувачів: кожен чат Telegram працює зі своєю поштою
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS accounts (
+            chat_id INTEGER PRIMARY KEY,
+            email TEXT,
+            token_json TEXT,
+            updated_at TIMESTAMP
+        )
+    ''')
+
+    # Чати, підписані на сповіщення про нову пошту
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            chat_id INTEGER PRIMARY KEY,
+            created_at TIMESTAMP
+        )
+    ''')
+
+    # Черга вихідних листів: status = pending | sending | sent | failed
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS outbox (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            gmail_id TEXT UNIQUE,
-            sender TEXT,
+            idempotency_key TEXT UNIQUE,
+            chat_id INTEGER,
             recipient TEXT,
             subject TEXT,
             body TEXT,
-            folder TEXT,
-            received_date TIMESTAMP
+            status TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            next_attempt_at REAL DEFAULT 0,
+            last_error TEXT,
+            gmail_id TEXT,
+            created_at TIMESTAMP
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at)")
+
+    # Останній historyId Gmail для кожного акаунта та папки
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sync_state (
+            account TEXT,
+            label TEXT,
+            history_id TEXT,
+            page_token TEXT,
+            PRIMARY KEY (account, label)
         )
     ''')
-    conn.commit()
-    conn.close()
+    # page_token — nextPageToken Gmail після найстарішого збереженого листа
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(sync_state)")]
+    if 'page_token' not in columns:
+        conn.execute("ALTER TABLE sync_state ADD COLUMN page_token TEXT")
+
+
+def _upsert_emails(conn, emails, folder, account):
+    conn.executemany('''
+        INSERT INTO emails (gmail_id, sender, subject, body, folder, received_date, account)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(account, gmail_id) DO UPDATE SET
+            sender = excluded.sender,
+            subject = excluded.subject,
+            body = excluded.body,
+            folder = excluded.folder,
+            received_date = excluded.received_date
+    ''', [(mail['id'], mail['sender'], mail['subject'], mail['snippet'], folder,
+           _db_date(mail.get('date')), account) for mail in emails])
+
+
+def save_emails(emails, folder='INBOX', account='me'):
+    """Зберігає сторінку листів (dict як у GmailService) однією транзакцією."""
+    try:
+        with transaction() as conn:
+            _upsert_emails(conn, emails, folder, account)
+    except Exception as e:
+        print(f"DB Error: {e}")
+
+
+def get_emails_page(account='me', folder='INBOX', limit=5, before=None):
+    """
+    Сторінка листів від новіших до старіших. before — курсор (received_date, id) останнього листа
+    попередньої сторінки. Keyset-пагінація по індексу: глибина сторінки не впливає на швидкість, на відміну від OFFSET.
+    """
+    if before is None:
+        where, params = "", (account, folder, limit)
+    else:
+        where, params = "AND (received_date, id) < (?, ?)", (account, folder, before[0], before[1], limit)
+
+    with _lock:
+        rows = get_connection().execute(f'''
+            SELECT gmail_id, sender, subject, body, received_date, id FROM emails
+            WHERE account = ? AND folder = ? {where}
+            ORDER BY received_date DESC, id DESC
+            LIMIT ?
+        ''', params).fetchall()
+    return [{'id': r[0], 'sender': r[1], 'subject': r[2], 'snippet': r[3] or '', 'cursor': (r[4], r[5])}
+            for r in rows]
+
+
+def get_message_body(account, gmail_id):
+    with _lock:
+        row = get_connection().execute("SELECT body FROM message_bodies WHERE account = ? AND gmail_id = ?",
+                                       (account, gmail_id)).fetchone()
+    return row[0] if row else None
+
 
-def save_email(gmail_id, sender, subject, snippet, folder='INBOX'):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+def save_message_body(account, gmail_id, body):
     try:
-        cursor.execute('''
-            INSERT OR IGNORE INTO emails (gmail_id, sender, subject, body, folder, received_date)
+        with transaction() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO message_bodies (account, gmail_id, body, cached_at) VALUES (?, ?, ?, ?)
+            ''', (account, gmail_id, body, _db_date(None)))
+    except Exception as e:
+        print(f"DB Error: {e}")
+
+
+def save_account(chat_id, token_json, email=None):
+    """Зберігає (або оновлює) OAuth-токен чату; email не перезаписується, якщо не передано."""
+    with transaction() as conn:
+        conn.execute('''
+            INSERT INTO accounts (chat_id, email, token_json, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(chat_id) DO UPDATE SET
+                email = COALESCE(excluded.email, accounts.email),
+                token_json = excluded.token_json,
+                updated_at = excluded.updated_at
+        ''', (chat_id, email, token_json, _db_date(None)))
+
+
+def get_account_token(chat_id):
+    with _lock:
+        row = get_connection().execute("SELECT token_json FROM accounts WHERE chat_id = ?", (chat_id,)).fetchone()
+    return row[0] if row else None
+
+
+def delete_account(chat_id):
+    """Видаляє токен чату разом з локальною копією його пошти (списки і тексти листів)."""
+    account = str(chat_id)
+    with transaction() as conn:
+        conn.execute("DELETE FROM accounts WHERE chat_id = ?", (chat_id,))
+        conn.execute("DELETE FROM emails WHERE account = ?", (account,))
+        conn.execute("DELETE FROM message_bodies WHERE account = ?", (account,))
+        conn.execute("DELETE FROM sync_state WHERE account = ?", (account,))
+        conn.execute("DELETE FROM subscriptions WHERE chat_id = ?", (chat_id,))
+
+
+def add_subscription(chat_id):
+    with transaction() as conn:
+        conn.execute("INSERT OR IGNORE INTO subscriptions (chat_id, created_at) VALUES (?, ?)",
+                     (chat_id, _db_date(None)))
+
+
+def remove_subscription(chat_id):
+    with transaction() as conn:
+        conn.execute("DELETE FROM subscriptions WHERE chat_id = ?", (chat_id,))
+
+
+def get_subscriptions():
+    with _lock:
+        rows = get_connection().execute("SELECT chat_id FROM subscriptions").fetchall()
+    return [r[0] for r in rows]
+
+
+def enqueue_outbox(idempotency_key, chat_id, recipient, subject, body):
+    """Додає лист у чергу; повторний виклик з тим самим ключем не створює дубліката. Повертає (id, чи новий)."""
+    with transaction() as conn:
+        cursor = conn.execute('''
+            INSERT OR IGNORE INTO outbox (idempotency_key, chat_id, recipient, subject, body, created_at)
             VALUES (?, ?, ?, ?, ?, ?)
-        ''', (gmail_id, sender, subject, snippet, folder, datetime.now()))
-        conn.commit()
+        ''', (idempotency_key, chat_id, recipient, subject, body, _db_date(None)))
+        created = cursor.rowcount == 1
+        row = conn.execute("SELECT id FROM outbox WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+    return row[0], created
+
+
+def claim_outbox(now, limit=20):
+    """Забирає листи, яким настав час відправки: переводить їх у 'sending' і збільшує attempts."""
+    with transaction() as conn:
+        rows = conn.execute('''
+            SELECT id, idempotency_key, chat_id, recipient, subject, body, attempts FROM outbox
+            WHERE status = 'pending' AND next_attempt_at <= ?
+            ORDER BY next_attempt_at, id
+            LIMIT ?
+        ''', (now, limit)).fetchall()
+        conn.executemany("UPDATE outbox SET status = 'sending', attempts = attempts + 1 WHERE id = ?",
+                         [(r[0],) for r in rows])
+    return [{'id': r[0], 'key': r[1], 'chat_id': r[2], 'recipient': r[3], 'subject': r[4], 'body': r[5],
+             'attempts': r[6] + 1} for r in rows]
+
+
+def finish_outbox(outbox_id, status, error=None, gmail_id=None):
+    with transaction() as conn:
+        conn.execute("UPDATE outbox SET status = ?, last_error = ?, gmail_id = ? WHERE id = ?",
+                     (status, error, gmail_id, outbox_id))
+
+
+def retry_outbox(outbox_id, next_attempt_at, error):
+    with transaction() as conn:
+        conn.execute('''
+            UPDATE outbox SET status = 'pending', next_attempt_at = ?, last_error = ? WHERE id = ?
+        ''', (next_attempt_at, error, outbox_id))
+
+
+def reset_stale_outbox():
+    """Після перезапуску повертає в чергу листи, відправка яких обірвалася на півдорозі."""
+    with transaction() as conn:
+        conn.execute("UPDATE outbox SET status = 'pending' WHERE status = 'sending'")
+
+
+def _fts_query(text):
+    # Кожне слово — окремий префіксний терм у лапках, щоб ввід користувача не ламав синтаксис FTS5
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_emails(query, limit=5, offset=0, account='me'):
+    """Шукає листи за темою, відправником і текстом; результати впорядковані за релевантністю (bm25)."""
+    match = _fts_query(query)
+    if not match:
+        return []
+    with _lock:
+        rows = get_connection().execute('''
+            SELECT e.gmail_id, e.sender, e.subject, e.body FROM emails_fts
+            JOIN emails e ON e.id = emails_fts.rowid
+            WHERE emails_fts MATCH ? AND e.account = ?
+            ORDER BY emails_fts.rank
+            LIMIT ? OFFSET ?
+        ''', (match, account, limit, offset)).fetchall()
+    return [{'id': r[0], 'sender': r[1], 'subject': r[2], 'snippet': r[3] or ''} for r in rows]
+
+
+def get_sync_cursor(account='me', label='INBOX'):
+    with _lock:
+        row = get_connection().execute("SELECT history_id FROM sync_state WHERE account = ? AND label = ?",
+                                       (account, label)).fetchone()
+    return row[0] if row else None
+
+
+def _set_sync_cursor(conn, account, label, history_id):
+    conn.execute('''
+        INSERT INTO sync_state (account, label, history_id) VALUES (?, ?, ?)
+        ON CONFLICT(account, label) DO UPDATE SET history_id = excluded.history_id
+    ''', (account, label, str(history_id)))
+
+
+def _set_page_token(conn, account, label, page_token):
+    conn.execute('''
+        INSERT INTO sync_state (account, label, page_token) VALUES (?, ?, ?)
+        ON CONFLICT(account, label) DO UPDATE SET page_token = excluded.page_token
+    ''', (account, label, page_token))
+
+
+def get_page_token(account='me', label='INBOX'):
+    with _lock:
+        row = get_connection().execute("SELECT page_token FROM sync_state WHERE account = ? AND label = ?",
+                                       (account, label)).fetchone()
+    return row[0] if row else None
+
+
+def save_page(emails, next_page_token, account='me', folder='INBOX'):
+    """Зберігає догружену сторінку старіших листів разом з токеном наступної сторінки."""
+    try:
+        with transaction() as conn:
+            _upsert_emails(conn, emails, folder, account)
+            _set_page_token(conn, account, folder, next_page_token)
+    except Exception as e:
+        print(f"DB Error: {e}")
+
+
+def apply_sync_changes(changes, account='me', folder='INBOX'):
+    """Застосовує результат GmailService.sync_changes до локальної копії папки однією транзакцією."""
+    try:
+        with transaction() as conn:
+            if changes['full']:
+                conn.execute("DELETE FROM emails WHERE account = ? AND folder = ?", (account, folder))
+                _set_page_token(conn, account, folder, changes.get('next_page_token'))
+            _upsert_emails(conn, changes['added'], folder, account)
+            conn.executemany("DELETE FROM emails WHERE gmail_id = ? AND account = ?",
+                             [(gmail_id, account) for gmail_id in changes['deleted']])
+            _set_sync_cursor(conn, account, folder, changes['history_id'])
     except Exception as e:
         print(f"DB Error: {e}")
-    finally:
-        conn.close()
\ No newline at end of file
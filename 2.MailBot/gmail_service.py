@@ -1,26 +1,89 @@
 import os
+import json
 import base64
-import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from email.mime.text import MIMEText
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+import metrics
+from html_text import html_to_text, iter_base64_text
+
+# Бібліотеки Google імпортуються всередині методів: вони важкі і потрібні
+# лише після першого звернення до пошти, а не під час старту бота.
 
 # Якщо змінюємо права доступу, видаляємо token.json
 SCOPES = ['https://www.googleapis.com/auth/gmail.modify']
 
+# Локальна копія discovery-документа Gmail API, щоб не шукати/завантажувати його при кожному старті
+DISCOVERY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gmail_discovery.json')
+DISCOVERY_URL = 'https://gmail.googleapis.com/$discovery/rest?version=v1'
+
+# Для списку листів потрібні лише ці заголовки (format='metadata')
+METADATA_HEADERS = ['From', 'Subject']
+# Gmail рекомендує не більше 50 запитів в одному batch
+BATCH_LIMIT = 50
+# Максимум паралельних запитів, якщо batch недоступний
+FETCH_WORKERS = 4
+# Telegram обмежує довжину повідомлення, тому довші листи обрізаються
+MAX_MESSAGE_CHARS = 4000
+TRUNCATED_NOTICE = "\n\n[Текст скорочено]"
+# Типи подій history API, що змінюють вміст папки
+HISTORY_TYPES = ['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved']
+
+
+def load_discovery_document():
+    """Повертає discovery-документ Gmail API з диска, при першому запуску зберігаючи його туди."""
+    if os.path.exists(DISCOVERY_FILE):
+        with open(DISCOVERY_FILE, encoding='utf-8') as f:
+            return f.read()
+
+    from googleapiclient.discovery_cache import get_static_doc
+    document = get_static_doc('gmail', 'v1')
+    if document is None:
+        import httplib2
+        _, content = httplib2.Http().request(DISCOVERY_URL)
+        document = content.decode('utf-8')
+
+    try:
+        with open(DISCOVERY_FILE, 'w', encoding='utf-8') as f:
+            f.write(document)
+    except OSError as e:
+        print(f"Не вдалося зберегти discovery-документ: {e}")
+    return document
+
 
 class GmailService:
-    def __init__(self):
+    def __init__(self, cache=None, token_json=None, account='me'):
         self.creds = None
         self.service = None
-        self.authenticate()
+        # Кеш тексту листів (MessageCache), може бути спільним для кількох сервісів
+        self.cache = cache
+        # Ключ акаунта в кеші та локальній БД (як AsyncGmailService.account)
+        self.account = account
+        # httplib2.Http не потокобезпечний, тому кожен потік має власне з'єднання
+        self._local = threading.local()
+        # Кількість HTTP-запитів до Gmail API (batch рахується як один)
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+        self.authenticate(token_json)
 
-    def authenticate(self):
+    def authenticate(self, token_json=None):
         """
-        Перевіряє наявність файлу token.json.
+        Авторизується токеном користувача з БД (token_json) або, якщо його не передано,
+        перевіряє наявність файлу token.json.
         """
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
+        if token_json:
+            self.creds = Credentials.from_authorized_user_info(json.loads(token_json), SCOPES)
+            if not self.creds.valid:
+                # Для токенів з БД інтерактивного входу немає: без refresh_token потрібен /login
+                self.creds.refresh(Request())
+            self._build_service()
+            return
+
         if os.path.exists('token.json'):
             self.creds = Credentials.from_authorized_user_file('token.json', SCOPES)
 
@@ -42,109 +105,300 @@ class GmailService:
                 else:
                     raise FileNotFoundError("Не знайдено credentials.json або token.json!")
 
-        self.service = build('gmail', 'v1', credentials=self.creds)
+        self._build_service()
 
-    def send_message(self, recipient, subject, message_text):
-        """Створює та відправляє email."""
-        try:
-            message = MIMEText(message_text)
-            message['to'] = recipient
-            message['subject'] = subject
-            raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
-            body = {'raw': raw}
-
-            sent_message = self.service.users().messages().send(userId="me", body=body).execute()
-            return sent_message
-        except Exception as e:
-            print(f"An error occurred: {e}")
-            return None
+    def _build_service(self):
+        from googleapiclient.discovery import build_from_document
+        self.service = build_from_document(load_discovery_document(), credentials=self.creds)
+
+    def refresh_if_expiring(self, margin):
+        """Оновлює access token, якщо він спливає раніше ніж через margin. Повертає True, якщо оновлено."""
+        from google.auth.transport.requests import Request
+
+        if not self.creds.refresh_token:
+            return False
+        # google-auth зберігає expiry як naive UTC
+        if self.creds.expiry and self.creds.expiry - datetime.utcnow() > margin:
+            return False
+        self.creds.refresh(Request())
+        return True
+
+    def token_json(self):
+        return self.creds.to_json()
+
+    def get_email_address(self):
+        profile = self._execute(self.service.users().getProfile(userId='me'), 'users.getProfile')
+        return profile['emailAddress']
+
+    def _http(self):
+        """Повертає авторизоване HTTP-з'єднання поточного потоку."""
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            import httplib2
+            from google_auth_httplib2 import AuthorizedHttp
+            http = AuthorizedHttp(self.creds, http=httplib2.Http())
+            self._local.http = http
+        return http
+
+    def _execute(self, request, method):
+        """Виконує запит до Gmail API у з'єднанні поточного потоку, записуючи його тривалість у метрики."""
+        with self._count_lock:
+            self.request_count += 1
+        with metrics.track('gmail_request_seconds', method=method):
+            return request.execute(http=self._http())
+
+    def send_message(self, recipient, subject, message_text, message_id=None):
+        """
+        Створює та відправляє email. Помилки не перехоплюються: повторні спроби робить outbox.
+        message_id (заголовок Message-ID) дозволяє потім перевірити, чи лист уже відправлено.
+        """
+        message = MIMEText(message_text)
+        message['to'] = recipient
+        message['subject'] = subject
+        if message_id:
+            message['Message-ID'] = message_id
+        raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
+        body = {'raw': raw}
+
+        return self._execute(self.service.users().messages().send(userId="me", body=body), 'messages.send')
+
+    def find_sent_message(self, message_id):
+        """Повертає ID відправленого листа з таким Message-ID або None."""
+        results = self._execute(self.service.users().messages().list(
+            userId='me', q=f'in:sent rfc822msgid:{message_id}', maxResults=1), 'messages.list')
+        messages = results.get('messages', [])
+        return messages[0]['id'] if messages else None
 
     def get_latest_emails(self, count=5):
-        """Отримує заголовки останніх N листів."""
+        """Отримує заголовки останніх N листів (2 запити незалежно від N)."""
         try:
-            results = self.service.users().messages().list(userId='me', labelIds=['INBOX'], maxResults=count).execute()
-            messages = results.get('messages', [])
-
-            email_data = []
-            for msg in messages:
-                txt = self.service.users().messages().get(userId='me', id=msg['id']).execute()
-                payload = txt['payload']
-                headers = payload.get('headers', [])
-
-                subject = next((h['value'] for h in headers if h['name'] == 'Subject'), "Без теми")
-                sender = next((h['value'] for h in headers if h['name'] == 'From'), "Невідомий")
-                snippet = txt.get('snippet', '')
-
-                email_data.append({
-                    'id': msg['id'],
-                    'sender': sender,
-                    'subject': subject,
-                    'snippet': snippet
-                })
-            return email_data
+            results = self._execute(self.service.users().messages().list(
+                userId='me', labelIds=['INBOX'], maxResults=count), 'messages.list')
+            ids = [msg['id'] for msg in results.get('messages', [])]
+            return self.get_emails_metadata(ids)
         except Exception as e:
             print(f"Error getting emails: {e}")
             return []
 
-    def get_full_message_text(self, msg_id):
-        """Отримує повний текст листа за його ID з очисткою HTML."""
+    def list_page(self, label='INBOX', count=5, page_token=None):
+        """Сторінка листів папки за nextPageToken Gmail: {'emails', 'next_page_token'}."""
+        try:
+            results = self._execute(self.service.users().messages().list(
+                userId='me', labelIds=[label], maxResults=count, pageToken=page_token), 'messages.list')
+            ids = [msg['id'] for msg in results.get('messages', [])]
+            return {
+                'emails': self.get_emails_metadata(ids),
+                'next_page_token': results.get('nextPageToken')
+            }
+        except Exception as e:
+            print(f"Error getting emails: {e}")
+            return None
+
+    def get_emails_metadata(self, ids):
+        """Завантажує заголовки листів одним batch-запитом, зберігаючи порядок ids."""
+        if not ids:
+            return []
         try:
-            msg = self.service.users().messages().get(userId='me', id=msg_id, format='full').execute()
-            payload = msg['payload']
-
-            # Рекурсивна функція для пошуку тексту та його типу
-            def find_text_part(parts):
-                # 1. Спочатку шукаємо plain text (найкращий варіант)
-                for part in parts:
-                    if part['mimeType'] == 'text/plain' and 'data' in part['body']:
-                        return part['body']['data'], 'text/plain'
-
-                # 2. Якщо не знайшли, заходимо всередину multipart (рекурсія)
-                for part in parts:
-                    if 'parts' in part:
-                        data, mime = find_text_part(part['parts'])
-                        if data:
-                            return data, mime
-
-                # 3. Якщо plain text немає, беремо HTML
-                for part in parts:
-                    if part['mimeType'] == 'text/html' and 'data' in part['body']:
-                        return part['body']['data'], 'text/html'
-
-                return None, None
-
-            data, mime_type = None, None
-
-            if 'parts' in payload:
-                data, mime_type = find_text_part(payload['parts'])
+            found = self._fetch_metadata_batch(ids)
+        except Exception as e:
+            print(f"Batch-запит не вдався, паралельне завантаження: {e}")
+            found = self._fetch_metadata_concurrent(ids)
+        return [found[msg_id] for msg_id in ids if msg_id in found]
+
+    def _metadata_request(self, msg_id):
+        return self.service.users().messages().get(
+            userId='me', id=msg_id, format='metadata', metadataHeaders=METADATA_HEADERS)
+
+    @staticmethod
+    def _parse_metadata(msg):
+        headers = msg.get('payload', {}).get('headers', [])
+        subject = next((h['value'] for h in headers if h['name'] == 'Subject'), "Без теми")
+        sender = next((h['value'] for h in headers if h['name'] == 'From'), "Невідомий")
+        internal_date = msg.get('internalDate')
+        return {
+            'id': msg['id'],
+            'sender': sender,
+            'subject': subject,
+            'snippet': msg.get('snippet', ''),
+            'date': datetime.fromtimestamp(int(internal_date) / 1000) if internal_date else datetime.now()
+        }
+
+    def _fetch_metadata_batch(self, ids):
+        found = {}
+        failed = []
+
+        def callback(request_id, response, exception):
+            if exception is None:
+                found[request_id] = self._parse_metadata(response)
             else:
-                # Якщо лист простий (не multipart)
-                data = payload['body'].get('data')
-                mime_type = payload.get('mimeType')
+                failed.append(request_id)
+
+        for start in range(0, len(ids), BATCH_LIMIT):
+            batch = self.service.new_batch_http_request(callback=callback)
+            for msg_id in ids[start:start + BATCH_LIMIT]:
+                batch.add(self._metadata_request(msg_id), request_id=msg_id)
+            self._execute(batch, 'batch.messages.get')
+
+        # Окремі відмови всередині batch (наприклад, 429) довантажуємо поштучно
+        if failed:
+            found.update(self._fetch_metadata_concurrent(failed))
+        return found
+
+    def _fetch_metadata_concurrent(self, ids):
+        def fetch(msg_id):
+            try:
+                return self._execute(self._metadata_request(msg_id), 'messages.get')
+            except Exception as e:
+                print(f"Error getting email {msg_id}: {e}")
+                return None
+
+        found = {}
+        with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(ids))) as pool:
+            for msg in pool.map(fetch, ids):
+                if msg:
+                    found[msg['id']] = self._parse_metadata(msg)
+        return found
+
+    def sync_changes(self, history_id=None, label='INBOX', count=5):
+        """
+        Повертає зміни папки з моменту history_id:
+        {'history_id', 'added', 'deleted', 'full'}.
+        Без курсора або коли він застарів (404) виконує повну синхронізацію останніх count листів.
+        """
+        from googleapiclient.errors import HttpError
 
-            if data:
-                text = base64.urlsafe_b64decode(data).decode('utf-8')
+        try:
+            if history_id:
+                try:
+                    return self._incremental_sync(history_id, label)
+                except HttpError as e:
+                    if e.resp.status != 404:
+                        raise
+                    print("Курсор історії застарів, повна синхронізація.")
+            return self._full_sync(label, count)
+        except Exception as e:
+            print(f"Error syncing emails: {e}")
+            return None
 
-                # Якщо це HTML, чистимо теги
-                if mime_type == 'text/html':
-                    # Видаляємо вміст <head>, <style>, <script>
-                    text = re.sub(r'<head.*?>.*?</head>', '', text, flags=re.DOTALL | re.IGNORECASE)
-                    text = re.sub(r'<style.*?>.*?</style>', '', text, flags=re.DOTALL | re.IGNORECASE)
-                    text = re.sub(r'<script.*?>.*?</script>', '', text, flags=re.DOTALL | re.IGNORECASE)
+    def _full_sync(self, label, count):
+        # historyId беремо до вибірки, щоб не пропустити листи, що прийдуть під час неї
+        profile = self._execute(self.service.users().getProfile(userId='me'), 'users.getProfile')
+        results = self._execute(self.service.users().messages().list(
+            userId='me', labelIds=[label], maxResults=count), 'messages.list')
+        ids = [msg['id'] for msg in results.get('messages', [])]
+        return {
+            'history_id': profile['historyId'],
+            'added': self.get_emails_metadata(ids),
+            'deleted': [],
+            'full': True,
+            # Звідки продовжувати догрузку старіших листів (list_page)
+            'next_page_token': results.get('nextPageToken')
+        }
 
-                    # Замінюємо <br> та <p> на нові рядки
-                    text = re.sub(r'<br\s*/?>', '\n', text, flags=re.IGNORECASE)
-                    text = re.sub(r'</p>', '\n\n', text, flags=re.IGNORECASE)
+    def _incremental_sync(self, history_id, label):
+        added, deleted = [], set()
+        page_token = None
+        while True:
+            response = self._execute(self.service.users().history().list(
+                userId='me', startHistoryId=history_id, labelId=label,
+                historyTypes=HISTORY_TYPES, pageToken=page_token), 'history.list')
 
-                    # Видаляємо всі інші HTML теги
-                    text = re.sub(r'<[^>]+>', '', text)
+            for record in response.get('history', []):
+                for item in record.get('messagesAdded', []):
+                    if label in item['message'].get('labelIds', []):
+                        added.append(item['message']['id'])
+                        deleted.discard(item['message']['id'])
+                for item in record.get('labelsAdded', []):
+                    if label in item.get('labelIds', []):
+                        added.append(item['message']['id'])
+                        deleted.discard(item['message']['id'])
+                for item in record.get('messagesDeleted', []):
+                    deleted.add(item['message']['id'])
+                for item in record.get('labelsRemoved', []):
+                    if label in item.get('labelIds', []):
+                        deleted.add(item['message']['id'])
 
-                    # Прибираємо зайві пробіли та порожні рядки
-                    text = re.sub(r'\n\s*\n', '\n\n', text).strip()
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
 
-                return text
+        # Новіші події йдуть останніми; dict.fromkeys прибирає дублікати зі збереженням порядку
+        added_ids = [msg_id for msg_id in dict.fromkeys(reversed(added)) if msg_id not in deleted]
+        return {
+            'history_id': response.get('historyId', history_id),
+            'added': self.get_emails_metadata(added_ids),
+            'deleted': list(deleted),
+            'full': False
+        }
 
-            return "⚠️ Не вдалося розпізнати текст листа (можливо, це зображення)."
+    def get_full_message_text(self, msg_id):
+        """
+        Отримує текст листа за його ID з очисткою HTML (з кешу, якщо лист уже читали).
+        Текст обрізано до MAX_MESSAGE_CHARS, а обрізаний позначено TRUNCATED_NOTICE.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(self.account, msg_id)
+            if cached is not None:
+                return cached
 
+        try:
+            text = self._fetch_message_text(msg_id)
         except Exception as e:
-            return f"Помилка при завантаженні листа: {e}"
\ No newline at end of file
+            return f"Помилка при завантаженні листа: {e}"
+
+        if text is None:
+            return "⚠️ Не вдалося розпізнати текст листа (можливо, це зображення)."
+
+        # Листи в Gmail незмінні, тому текст можна кешувати без інвалідації
+        if self.cache is not None:
+            self.cache.put(self.account, msg_id, text)
+        return text
+
+    def _fetch_message_text(self, msg_id):
+        """Завантажує лист (format='full') і повертає його текст або None."""
+        msg = self._execute(self.service.users().messages().get(
+            userId='me', id=msg_id, format='full'), 'messages.get')
+        payload = msg['payload']
+
+        # Рекурсивна функція для пошуку тексту та його типу
+        def find_text_part(parts):
+            # 1. Спочатку шукаємо plain text (найкращий варіант)
+            for part in parts:
+                if part['mimeType'] == 'text/plain' and 'data' in part['body']:
+                    return part['body']['data'], 'text/plain'
+
+            # 2. Якщо не знайшли, заходимо всередину multipart (рекурсія)
+            for part in parts:
+                if 'parts' in part:
+                    data, mime = find_text_part(part['parts'])
+                    if data:
+                        return data, mime
+
+            # 3. Якщо plain text немає, беремо HTML
+            for part in parts:
+                if part['mimeType'] == 'text/html' and 'data' in part['body']:
+                    return part['body']['data'], 'text/html'
+
+            return None, None
+
+        data, mime_type = None, None
+
+        if 'parts' in payload:
+            data, mime_type = find_text_part(payload['parts'])
+        else:
+            # Якщо лист простий (не multipart)
+            data = payload['body'].get('data')
+            mime_type = payload.get('mimeType')
+
+        if not data:
+            return None
+
+        # HTML розбираємо потоково за один прохід і зупиняємось на ліміті Telegram
+        if mime_type == 'text/html':
+            text, truncated = html_to_text(iter_base64_text(data), MAX_MESSAGE_CHARS)
+        else:
+            text, truncated = base64.urlsafe_b64decode(data).decode('utf-8'), False
+
+        if truncated or len(text) > MAX_MESSAGE_CHARS:
+            return text[:MAX_MESSAGE_CHARS] + TRUNCATED_NOTICE
+        return text
@@ -0,0 +1,101 @@
+import base64
+import codecs
+import re
+from html.parser import HTMLParser
+
+# Розмір шматка base64 (кратний 4), який декодується і передається парсеру за раз
+CHUNK_SIZE = 16 * 1024
+
+# Вміст цих тегів не показуємо
+SKIP_TAGS = {'head', 'style', 'script', 'title', 'noscript'}
+# Блокові теги починаються з нового рядка
+BLOCK_TAGS = {'p', 'div', 'tr', 'li', 'ul', 'ol', 'table', 'blockquote', 'section', 'article',
+              'header', 'footer', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr'}
+
+
+class _TextExtractor(HTMLParser):
+    """Збирає видимий текст HTML за один прохід; зупиняється, щойно набрано max_chars символів."""
+
+    def __init__(self, max_chars=None):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.parts = []
+        self.length = 0
+        self.done = False
+        self._skip_depth = 0
+        # Скільки переносів рядка стоїть у кінці тексту (очистка лишає не більше двох)
+        self._newlines = 0
+
+    def _append(self, text):
+        self.parts.append(text)
+        self.length += len(text)
+        if self.max_chars is not None and self.length > self.max_chars:
+            self.done = True
+
+    def _newline(self, count=1):
+        # Рахуємо лише переноси, що переживуть очистку: не на початку тексту і не більше двох поспіль,
+        # інакше верстка з тисяч порожніх блоків "з'їдає" ліміт ще до змісту листа
+        count = min(count, 2 - self._newlines)
+        if self.length and count > 0:
+            self._newlines += count
+            self._append('\n' * count)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == 'br' or tag in BLOCK_TAGS:
+            self._newline()
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+        elif tag == 'p':
+            self._newline(2)
+        elif tag in BLOCK_TAGS:
+            self._newline()
+
+    def handle_data(self, data):
+        if self._skip_depth or self.done:
+            return
+        # Як і браузер, згортаємо пробіли та переноси рядків у коді сторінки
+        text = re.sub(r'\s+', ' ', data)
+        if text.strip():
+            self._newlines = 0
+            self._append(text)
+        elif text and self.parts and not self.parts[-1][-1].isspace():
+            # Пробіл між inline-тегами ("<b>John</b> <i>Smith</i>") розділяє слова
+            self._append(' ')
+
+
+def iter_base64_text(data, chunk_size=CHUNK_SIZE):
+    """Поступово декодує base64url-дані листа в рядки UTF-8."""
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    for start in range(0, len(data), chunk_size):
+        chunk = data[start:start + chunk_size]
+        # Останній шматок може бути без вирівнювання '='
+        chunk += '=' * (-len(chunk) % 4)
+        yield decoder.decode(base64.urlsafe_b64decode(chunk))
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def html_to_text(chunks, max_chars=None):
+    """
+    Перетворює HTML (ітерабельне шматків тексту) на простий текст. Повертає (текст, truncated).
+    Якщо задано max_chars, розбір припиняється, щойно текст перевищить цю довжину, і truncated = True:
+    решту листа не прочитано, навіть якщо після очистки текст став коротшим.
+    """
+    parser = _TextExtractor(max_chars)
+    for chunk in chunks:
+        parser.feed(chunk)
+        if parser.done:
+            break
+    else:
+        parser.close()
+
+    text = ''.join(parser.parts)
+    # Прибираємо пробіли по краях рядків та зайві порожні рядки
+    text = re.sub(r' {2,}', ' ', text)
+    text = re.sub(r'[ \t]*\n[ \t]*', '\n', text)
+    return re.sub(r'\n{3,}', '\n\n', text).strip(), parser.done
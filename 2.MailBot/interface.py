@@ -1,10 +1,17 @@
-import os
+import re
+import time
+import uuid
+import asyncio
 from pathlib import Path
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes, \
-    ConversationHandler
-from gmail_service import GmailService
-from db_manager import init_db, save_email
+from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, TypeHandler, filters, \
+    ContextTypes, ConversationHandler
+from metrics import timed, timed_handler
+from async_service import AsyncDB
+from accounts import create_login_flow, finish_login, OAUTH_REDIRECT_URI, LEGACY_ACCOUNT
+from services import get_account, get_gmail, gmail_pool, message_cache, warm_up
+from outbox import OutboxWorker
+from notifier import MailNotifier, NOTIFY_TICK
 from dotenv import load_dotenv
 
 BASE_DIR = Path(__file__).resolve().parent
@@ -12,15 +19,32 @@ ENV_PATH = BASE_DIR / '.env'
 load_dotenv(dotenv_path=ENV_PATH)
 
 RECIPIENT, SUBJECT, BODY = range(3)
+INBOX_SIZE = 5
+SEARCH_PAGE_SIZE = 5
+# Скільки оновлень Telegram обробляються одночасно
+CONCURRENT_UPDATES = 64
+# Як часто перевіряти, чи не спливають токени клієнтів у пулі (секунди)
+TOKEN_REFRESH_INTERVAL = 60
 
-init_db()
-try:
-    gmail = GmailService()
-except Exception as e:
-    print(f"Помилка ініціалізації сервісу: {e}")
-    gmail = None
+# Схема БД створюється при першому зверненні, клієнт Gmail — у services.get_gmail()
+db = AsyncDB()
+# Блокування догрузки старіших листів для кожного акаунта
+_load_locks = {}
 
 
+async def sync_inbox(gmail):
+    """Підтягує зміни з Gmail у локальну БД (без нових листів — один запит до API); повертає ці зміни."""
+    changes = await gmail.sync_changes(await db.get_sync_cursor(gmail.account, 'INBOX'), 'INBOX', INBOX_SIZE)
+    if changes:
+        await db.apply_sync_changes(changes, gmail.account, 'INBOX')
+    return changes
+
+
+notifier = MailNotifier(db, get_gmail, sync_inbox)
+outbox = OutboxWorker(db, get_gmail)
+
+
+@timed_handler
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [['Оновити вхідні', 'Написати лист']]
     await update.message.reply_text(
@@ -29,78 +53,213 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+@timed_handler
 async def check_inbox(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    gmail = await get_gmail(update.effective_chat.id)
     if not gmail:
-        await update.message.reply_text("Помилка авторизації.")
+        await update.message.reply_text("Помилка авторизації. Підключіть пошту командою /login.")
         return
 
     await update.message.reply_text("Завантаження даних...")
-    emails = gmail.get_latest_emails(5)
+    await sync_inbox(gmail)
 
-    if not emails:
-        await update.message.reply_text("Вхідні пусті або відсутній доступ.")
+    # Стек курсорів початку сторінок: перша сторінка починається з найновішого листа
+    context.user_data['inbox_pages'] = [None]
+    response_text, reply_markup = await render_inbox_page(gmail, context, None)
+    await update.message.reply_text(response_text, parse_mode='Markdown', reply_markup=reply_markup)
+
+
+@timed_handler
+async def inbox_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    pages = context.user_data.get('inbox_pages')
+    gmail = await get_gmail(update.effective_chat.id)
+    if not pages or not gmail:
+        await query.edit_message_text("Дані застаріли. Оновіть список.")
         return
 
-    response_text = "**Список останніх повідомлень:**\n\n"
+    if query.data == 'inbox_next':
+        before = context.user_data.get('inbox_last')
+        # Зазвичай сторінку вже догружено у фоні, інакше чекаємо на догрузку
+        await load_older_emails(gmail, before)
+        if await db.get_emails_page(gmail.account, 'INBOX', 1, before):
+            pages.append(before)
+    elif len(pages) > 1:
+        pages.pop()
+
+    response_text, reply_markup = await render_inbox_page(gmail, context, pages[-1])
+    await query.edit_message_text(response_text, parse_mode='Markdown', reply_markup=reply_markup)
+
+
+async def render_inbox_page(gmail, context, before):
+    """Сторінка вхідних з локальної БД (keyset за received_date, id) з кнопками навігації."""
+    # Запитуємо на один запис більше, щоб знати, чи є наступна сторінка
+    emails = await db.get_emails_page(gmail.account, 'INBOX', INBOX_SIZE + 1, before)
+    has_next = len(emails) > INBOX_SIZE or bool(await db.get_page_token(gmail.account, 'INBOX'))
+    emails = emails[:INBOX_SIZE]
 
-    context.user_data['last_emails'] = {}
+    if not emails:
+        return "Вхідні пусті або відсутній доступ.", None
+
+    page = len(context.user_data['inbox_pages'])
+    title = "**Список останніх повідомлень:**" if page == 1 else f"**Вхідні, сторінка {page}:**"
+    response_text, buttons_row = render_email_list(emails, title)
+
+    last = emails[-1]['cursor']
+    context.user_data['inbox_last'] = last
+    # Наступну сторінку готуємо заздалегідь, щоб "Далі" відкривалась миттєво
+    if has_next:
+        context.application.create_task(load_older_emails(gmail, last))
+
+    nav_row = []
+    if page > 1:
+        nav_row.append(InlineKeyboardButton("◀️ Назад", callback_data="inbox_prev"))
+    if has_next:
+        nav_row.append(InlineKeyboardButton("Далі ▶️", callback_data="inbox_next"))
+
+    keyboard = [buttons_row, nav_row] if nav_row else [buttons_row]
+    return response_text, InlineKeyboardMarkup(keyboard)
+
+
+async def load_older_emails(gmail, before):
+    """
+    Гарантує, що після курсора before у БД є повна сторінка (+1 лист),
+    догружаючи старіші листи з Gmail за збереженим nextPageToken.
+    """
+    # Одночасно лише одна догрузка на акаунт: повторний виклик дочекається першої
+    lock = _load_locks.setdefault(gmail.account, asyncio.Lock())
+    async with lock:
+        while len(await db.get_emails_page(gmail.account, 'INBOX', INBOX_SIZE + 1, before)) <= INBOX_SIZE:
+            page_token = await db.get_page_token(gmail.account, 'INBOX')
+            if not page_token:
+                return
+            page = await gmail.list_page('INBOX', INBOX_SIZE, page_token)
+            if not page:
+                return
+            await db.save_page(page['emails'], page['next_page_token'], gmail.account, 'INBOX')
+
+
+def render_email_list(emails, title):
+    """
+    Формує текст списку листів і кнопки "Читати N". ID листа Gmail передається в самій кнопці
+    (read_<N>_<id>, в межах 64 байтів callback_data), тож кнопки старого списку відкривають свої листи.
+    """
+    response_text = f"{title}\n\n"
     buttons_row = []
 
     for i, mail in enumerate(emails):
-        # Збереження в локальну БД
-        save_email(mail['id'], mail['sender'], mail['subject'], mail['snippet'])
-
         idx = str(i + 1)
-        context.user_data['last_emails'][idx] = mail['id']
-
         response_text += f"{idx}. Від: {mail['sender']}\nТема: {mail['subject']}\nЗміст: {mail['snippet'][:50]}...\n\n"
-        buttons_row.append(InlineKeyboardButton(f"Читати {idx}", callback_data=f"read_{idx}"))
+        buttons_row.append(InlineKeyboardButton(f"Читати {idx}", callback_data=f"read_{idx}_{mail['id']}"))
 
     response_text += "*Оберіть лист для перегляду:*"
+    return response_text, buttons_row
+
 
-    reply_markup = InlineKeyboardMarkup([buttons_row])
+@timed_handler
+async def search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/search <текст> — пошук по збережених листах без звернення до Gmail."""
+    text = ' '.join(context.args)
+    if not text:
+        await update.message.reply_text("Використання: /search <текст>")
+        return
+
+    # Пошук іде лише по локальній БД, тому клієнт Gmail (і мережа) не потрібен
+    account = await get_account(update.effective_chat.id)
+    context.user_data['search_query'] = text
+    response_text, reply_markup = await render_search_page(account, text, 0)
     await update.message.reply_text(response_text, parse_mode='Markdown', reply_markup=reply_markup)
 
 
-async def read_email_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@timed_handler
+async def search_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    idx = query.data.split("_")[1]
-    email_id = context.user_data.get('last_emails', {}).get(idx)
+    text = context.user_data.get('search_query')
+    if not text:
+        await query.edit_message_text("Дані застаріли. Повторіть пошук.")
+        return
+
+    account = await get_account(update.effective_chat.id)
+    offset = int(query.data.split("_")[1])
+    response_text, reply_markup = await render_search_page(account, text, offset)
+    await query.edit_message_text(response_text, parse_mode='Markdown', reply_markup=reply_markup)
+
+
+async def render_search_page(account, text, offset):
+    # Запитуємо на один запис більше, щоб знати, чи є наступна сторінка
+    emails = await db.search_emails(text, SEARCH_PAGE_SIZE + 1, offset, account)
+    has_next = len(emails) > SEARCH_PAGE_SIZE
+    emails = emails[:SEARCH_PAGE_SIZE]
+
+    if not emails:
+        return "Нічого не знайдено.", None
+
+    response_text, buttons_row = render_email_list(emails, f"**Результати пошуку (з {offset + 1}):**")
 
-    if not email_id:
+    nav_row = []
+    if offset > 0:
+        nav_row.append(InlineKeyboardButton("◀️ Назад",
+                                            callback_data=f"search_{max(offset - SEARCH_PAGE_SIZE, 0)}"))
+    if has_next:
+        nav_row.append(InlineKeyboardButton("Далі ▶️", callback_data=f"search_{offset + SEARCH_PAGE_SIZE}"))
+
+    keyboard = [buttons_row, nav_row] if nav_row else [buttons_row]
+    return response_text, InlineKeyboardMarkup(keyboard)
+
+
+@timed_handler
+async def read_email_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    parts = query.data.split("_", 2)
+    if len(parts) < 3:
+        # Кнопка зі списку, створеного до появи ID у callback_data
         await query.edit_message_text("Дані застаріли. Оновіть список.")
         return
+    _, idx, email_id = parts
 
-    await query.message.reply_text("Отримання тексту...")
-
-    full_text = gmail.get_full_message_text(email_id)
+    gmail = await get_gmail(update.effective_chat.id)
+    if not gmail:
+        await query.message.reply_text("Сервіс недоступний.")
+        return
 
-    if len(full_text) > 4000:
-        full_text = full_text[:4000] + "\n\n[Текст скорочено]"
+    await query.message.reply_text("Отримання тексту...")
 
+    # Текст уже обрізано до ліміту Telegram у GmailService
+    full_text = await gmail.get_full_message_text(email_id)
     await query.message.reply_text(f"**Лист №{idx}**\n\n{full_text}", parse_mode='Markdown')
 
 
+@timed_handler
 async def start_email(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Ключ ідемпотентності: повторна доставка того самого оновлення не створить другий лист
+    context.user_data['outbox_key'] = uuid.uuid4().hex
     await update.message.reply_text("Введіть email отримувача:", reply_markup=ReplyKeyboardRemove())
     return RECIPIENT
 
 
+@timed_handler
 async def get_recipient(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['recipient'] = update.message.text
     await update.message.reply_text("Введіть тему листа:")
     return SUBJECT
 
 
+@timed_handler
 async def get_subject(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['subject'] = update.message.text
     await update.message.reply_text("Введіть текст повідомлення:")
     return BODY
 
 
+@timed_handler
 async def send_email_finish(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    gmail = await get_gmail(update.effective_chat.id)
     if not gmail:
         await update.message.reply_text("Сервіс недоступний.")
         return ConversationHandler.END
@@ -108,21 +267,24 @@ async def send_email_finish(update: Update, context: ContextTypes.DEFAULT_TYPE):
     recipient = context.user_data['recipient']
     subject = context.user_data['subject']
     body = update.message.text
-
-    await update.message.reply_text("Виконується відправка...")
-    result = gmail.send_message(recipient, subject, body)
+    key = context.user_data.get('outbox_key') or uuid.uuid4().hex
 
     keyboard = [['Оновити вхідні', 'Написати лист']]
-    if result:
-        await update.message.reply_text("Лист відправлено.",
-                                        reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True))
-    else:
+    try:
+        await outbox.enqueue(key, update.effective_chat.id, recipient, subject, body)
+    except Exception as e:
+        print(f"DB Error: {e}")
         await update.message.reply_text("Помилка відправки.",
                                         reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True))
+        return ConversationHandler.END
 
+    # Про результат відправки воркер повідомить окремим повідомленням
+    await update.message.reply_text("Лист поставлено в чергу на відправку.",
+                                    reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True))
     return ConversationHandler.END
 
 
+@timed_handler
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("Скасовано.",
                                     reply_markup=ReplyKeyboardMarkup([['Оновити вхідні', 'Написати лист']],
@@ -130,15 +292,120 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 
-async def run_bot():
-    load_dotenv(dotenv_path=ENV_PATH)
-    token = os.environ.get("TELEGRAM_TOKEN")
+@timed_handler
+async def login(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/login — підключення власної скриньки Gmail до цього чату."""
+    try:
+        flow, url, state = create_login_flow()
+    except Exception as e:
+        await update.message.reply_text(f"Вхід недоступний: {e}")
+        return
+
+    context.chat_data['oauth_flow'] = (flow, state)
+    await update.message.reply_text(
+        "1. Відкрийте посилання та надайте доступ до пошти:\n"
+        f"{url}\n\n"
+        f"2. Браузер перейде на {OAUTH_REDIRECT_URI} (сторінка може не відкритися) — "
+        "скопіюйте адресу з адресного рядка та надішліть її сюди."
+    )
+
+
+@timed_handler
+async def login_redirect(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # У посиланні живий код авторизації — не лишаємо його в історії чату
+    try:
+        await update.message.delete()
+    except Exception as e:
+        print(f"Не вдалося видалити повідомлення з кодом авторизації: {e}")
+
+    pending = context.chat_data.pop('oauth_flow', None)
+    if not pending:
+        await update.message.reply_text("Спочатку виконайте /login.")
+        return
+
+    flow, state = pending
+    chat_id = update.effective_chat.id
+    try:
+        loop = asyncio.get_running_loop()
+        token_json, email = await loop.run_in_executor(None, finish_login, flow, state, update.message.text)
+        await db.save_account(chat_id, token_json, email)
+    except Exception as e:
+        await update.message.reply_text(f"Не вдалося підключити пошту: {e}")
+        return
+
+    # Наступне звернення створить клієнт з новим токеном
+    gmail_pool.evict(chat_id)
+    await update.message.reply_text(f"Пошту {email} підключено.")
+
+
+@timed_handler
+async def logout(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    await db.delete_account(chat_id)
+    message_cache.forget_account(str(chat_id))
+    await notifier.unsubscribe(chat_id)
+    gmail_pool.evict(chat_id)
+    await update.message.reply_text("Пошту відключено, локальні дані видалено.")
 
-    if not token:
-        print("Помилка: TELEGRAM_TOKEN не знайдено.")
+
+@timed_handler
+async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/subscribe — сповіщення про нові листи без натискання "Оновити вхідні"."""
+    gmail = await get_gmail(update.effective_chat.id)
+    if not gmail:
+        await update.message.reply_text("Помилка авторизації. Підключіть пошту командою /login.")
+        return
+    if gmail.account == LEGACY_ACCOUNT:
+        # Спільна скринька має один курсор історії на всі чати — сповіщення дійшло б лише до одного з них
+        await update.message.reply_text("Сповіщення доступні лише для власної пошти. Підключіть її командою /login.")
         return
 
-    application = Application.builder().token(token).build()
+    await notifier.subscribe(update.effective_chat.id)
+    await update.message.reply_text("Сповіщення про нові листи увімкнено. Вимкнути: /unsubscribe")
+
+
+@timed_handler
+async def unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await notifier.unsubscribe(update.effective_chat.id)
+    await update.message.reply_text("Сповіщення вимкнено.")
+
+
+@timed('job_seconds')
+async def refresh_tokens(context: ContextTypes.DEFAULT_TYPE):
+    """Періодична задача: оновлює токени до того, як вони знадобляться в обробнику."""
+    await gmail_pool.refresh_expiring()
+
+
+def start_background_tasks(application):
+    """Запускає фонові задачі після application.start()."""
+    # Клієнт Gmail створюється у фоні, поки бот уже приймає оновлення
+    application.create_task(warm_up())
+    outbox.start(application.bot)
+
+
+async def stop_background_tasks():
+    await outbox.stop()
+
+
+def log_first_update(started_at):
+    """Обробник, який один раз друкує час від старту процесу до першого оновлення."""
+    logged = False
+
+    async def callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        nonlocal logged
+        if not logged:
+            logged = True
+            print(f"Перше оновлення через {time.monotonic() - started_at:.2f} с після старту.")
+
+    return callback
+
+
+def build_application(token, started_at=None):
+    """Створює Application з усіма обробниками (без запуску отримання оновлень)."""
+    application = Application.builder().token(token).concurrent_updates(CONCURRENT_UPDATES).build()
+
+    if started_at is not None:
+        application.add_handler(TypeHandler(Update, log_first_update(started_at)), group=-1)
 
     conv_handler = ConversationHandler(
         entry_points=[MessageHandler(filters.Regex('^Написати лист$'), start_email)],
@@ -151,8 +418,22 @@ async def run_bot():
     )
 
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("login", login))
+    application.add_handler(CommandHandler("logout", logout))
     application.add_handler(MessageHandler(filters.Regex('^Оновити вхідні$'), check_inbox))
+    application.add_handler(CommandHandler("search", search))
+    application.add_handler(CommandHandler("subscribe", subscribe))
+    application.add_handler(CommandHandler("unsubscribe", unsubscribe))
     application.add_handler(CallbackQueryHandler(read_email_callback, pattern="^read_"))
+    application.add_handler(CallbackQueryHandler(search_page_callback, pattern="^search_"))
+    application.add_handler(CallbackQueryHandler(inbox_page_callback, pattern="^inbox_"))
     application.add_handler(conv_handler)
+    # Після conv_handler, щоб текст листа з таким посиланням не сприймався як вхід
+    application.add_handler(MessageHandler(filters.Regex('^' + re.escape(OAUTH_REDIRECT_URI.rstrip('/'))),
+                                           login_redirect))
+
+    application.job_queue.run_repeating(refresh_tokens, interval=TOKEN_REFRESH_INTERVAL,
+                                        first=TOKEN_REFRESH_INTERVAL)
+    application.job_queue.run_repeating(notifier.tick, interval=NOTIFY_TICK, first=NOTIFY_TICK)
 
-    await application.run_polling()
\ No newline at end of file
+    return application
@@ -1,30 +1,74 @@
+import time
+
+# Момент старту фіксуємо до імпортів, щоб виміряти повний час до першого оновлення
+STARTED_AT = time.monotonic()
+
 import os
+import argparse
 import asyncio
-import threading
-from flask import Flask
-from interface import run_bot
+import secrets
+import uvicorn
+from telegram import Update
+from interface import build_application, start_background_tasks, stop_background_tasks
+from web import WebApp
 from dotenv import load_dotenv
-import nest_asyncio
 
 load_dotenv()
-nest_asyncio.apply()  # Allow nested event loops
 
-app = Flask(__name__)
+WEBHOOK_PATH = "/telegram"
+
+
+async def run(use_polling):
+    token = os.environ.get("TELEGRAM_TOKEN")
+    if not token:
+        print("Помилка: TELEGRAM_TOKEN не знайдено.")
+        return
+
+    # Публічна адреса сервісу; Render задає RENDER_EXTERNAL_URL автоматично
+    public_url = os.environ.get("WEBHOOK_URL") or os.environ.get("RENDER_EXTERNAL_URL")
+    if not use_polling and not public_url:
+        print("WEBHOOK_URL не задано, використовується polling.")
+        use_polling = True
 
-@app.route('/')
-def home():
-    return "Bot is alive! (Ця сторінка потрібна, щоб Render не вимикав сервіс)"
+    secret_token = os.environ.get("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+    application = build_application(token, STARTED_AT)
+    web_app = WebApp(application, WEBHOOK_PATH, secret_token)
 
-def run_flask():
     port = int(os.environ.get("PORT", 10000))
-    app.run(host="0.0.0.0", port=port, threaded=True)
+    server = uvicorn.Server(uvicorn.Config(web_app, host="0.0.0.0", port=port, lifespan="off", log_level="warning"))
+
+    await application.initialize()
+    await application.start()
+    start_background_tasks(application)
+    try:
+        if use_polling:
+            await application.bot.delete_webhook()
+            await application.updater.start_polling()
+            print("Бот працює в режимі polling.")
+        else:
+            await application.bot.set_webhook(url=public_url.rstrip('/') + WEBHOOK_PATH,
+                                              secret_token=secret_token,
+                                              allowed_updates=Update.ALL_TYPES)
+            print("Бот працює в режимі webhook.")
+
+        # Один event loop обслуговує і HTTP-сервер, і обробку оновлень
+        await server.serve()
+    finally:
+        await stop_background_tasks()
+        if application.updater.running:
+            await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+
 
 if __name__ == "__main__":
-    flask_thread = threading.Thread(target=run_flask, daemon=True)
-    flask_thread.start()
+    parser = argparse.ArgumentParser(description="Email Telegram Bot")
+    parser.add_argument("--polling", action="store_true",
+                        help="отримувати оновлення через long polling замість вебхука")
+    args = parser.parse_args()
 
     print("Запуск Telegram бота...")
     try:
-        asyncio.run(run_bot())
+        asyncio.run(run(args.polling or os.environ.get("BOT_MODE") == "polling"))
     except KeyboardInterrupt:
-        print("Бот зупинений.")
\ No newline at end of file
+        print("Бот зупинений.")
@@ -0,0 +1,80 @@
+import sys
+import threading
+from collections import OrderedDict
+
+import db_manager
+import metrics
+
+# Ліміт пам'яті для першого рівня кешу (байти)
+MAX_CACHE_BYTES = 8 * 1024 * 1024
+
+
+class MessageCache:
+    """
+    Дворівневий кеш тексту листів за (акаунт, gmail_id):
+    1) LRU у пам'яті з обмеженням за розміром;
+    2) таблиця message_bodies у SQLite (переживає перезапуск бота).
+    """
+
+    def __init__(self, max_bytes=MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, account, gmail_id):
+        key = (account, gmail_id)
+        with self._lock:
+            text = self._items.get(key)
+            if text is not None:
+                self._items.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                metrics.inc('message_cache_total', result='memory_hit')
+                return text
+
+        text = db_manager.get_message_body(account, gmail_id)
+        if text is None:
+            with self._lock:
+                self.stats['misses'] += 1
+            metrics.inc('message_cache_total', result='miss')
+            return None
+
+        with self._lock:
+            self.stats['disk_hits'] += 1
+            metrics.inc('message_cache_total', result='disk_hit')
+            self._remember(key, text)
+        return text
+
+    def put(self, account, gmail_id, text):
+        db_manager.save_message_body(account, gmail_id, text)
+        with self._lock:
+            self._remember((account, gmail_id), text)
+
+    def forget_account(self, account):
+        """Прибирає з пам'яті тексти листів акаунта (рядки в БД видаляє db_manager.delete_account)."""
+        with self._lock:
+            for key in [key for key in self._items if key[0] == account]:
+                self._size -= sys.getsizeof(self._items.pop(key))
+
+    def _remember(self, key, text):
+        size = sys.getsizeof(text)
+        if size > self.max_bytes:
+            return
+
+        old = self._items.pop(key, None)
+        if old is not None:
+            self._size -= sys.getsizeof(old)
+        self._items[key] = text
+        self._size += size
+
+        while self._size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self._size -= sys.getsizeof(evicted)
+            self.stats['evictions'] += 1
+            metrics.inc('message_cache_evictions_total')
+
+    def snapshot(self):
+        """Лічильники та поточний розмір кешу (для моніторингу)."""
+        with self._lock:
+            return dict(self.stats, memory_items=len(self._items), memory_bytes=self._size)
@@ -0,0 +1,186 @@
+import asyncio
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Межі кошиків гістограм затримки (секунди), як у клієнтах Prometheus
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Обробники, для яких вмикається семплювальний профайлер, напр. PROFILE_HANDLERS=check_inbox,read_email_callback
+PROFILED_HANDLERS = {name.strip() for name in os.environ.get("PROFILE_HANDLERS", "").split(",") if name.strip()}
+PROFILE_INTERVAL = 0.005
+
+_lock = threading.Lock()
+# (метрика, мітки) -> [лічильники кошиків..., сума, кількість]
+_histograms = {}
+# (метрика, мітки) -> значення
+_counters = {}
+
+
+def _key(metric, labels):
+    return metric, tuple(sorted(labels.items()))
+
+
+def observe(metric, seconds, **labels):
+    """Додає вимір у гістограму metric."""
+    key = _key(metric, labels)
+    with _lock:
+        data = _histograms.get(key)
+        if data is None:
+            data = _histograms[key] = [0] * len(BUCKETS) + [0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                data[i] += 1
+        data[-2] += seconds
+        data[-1] += 1
+
+
+def inc(metric, value=1, **labels):
+    """Збільшує лічильник metric."""
+    key = _key(metric, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+@contextmanager
+def track(metric, **labels):
+    """Вимірює час блоку; помилки додатково рахуються в errors_total."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        inc('errors_total', metric=metric, **labels)
+        raise
+    finally:
+        observe(metric, time.perf_counter() - start, **labels)
+
+
+def timed(metric, **labels):
+    """Декоратор для звичайних і async-функцій; за замовчуванням мітка name — ім'я функції."""
+
+    def decorator(func):
+        func_labels = labels or {'name': func.__name__}
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with track(metric, **func_labels):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(metric, **func_labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def timed_handler(func):
+    """Декоратор обробників Telegram: гістограма handler_seconds і, за потреби, профайлер."""
+    name = func.__name__
+    profiled = name in PROFILED_HANDLERS
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if profiled:
+            profiler.enter()
+        try:
+            with track('handler_seconds', handler=name):
+                return await func(*args, **kwargs)
+        finally:
+            if profiled:
+                profiler.exit()
+
+    return wrapper
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ''
+    escaped = ('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in items)
+    return '{' + ','.join(escaped) + '}'
+
+
+def render_prometheus():
+    """Усі метрики у текстовому форматі Prometheus (для /metrics)."""
+    with _lock:
+        histograms = {key: list(data) for key, data in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    seen = set()
+    for (metric, labels), data in sorted(histograms.items()):
+        if metric not in seen:
+            lines.append(f"# TYPE {metric} histogram")
+            seen.add(metric)
+        for bound, count in zip(BUCKETS, data):
+            lines.append(f"{metric}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+        lines.append(f"{metric}_bucket{_format_labels(labels, [('le', '+Inf')])} {data[-1]}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {data[-2]}")
+        lines.append(f"{metric}_count{_format_labels(labels)} {data[-1]}")
+
+    for (metric, labels), value in sorted(counters.items()):
+        if metric not in seen:
+            lines.append(f"# TYPE {metric} counter")
+            seen.add(metric)
+        lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+    return '\n'.join(lines) + '\n'
+
+
+class SamplingProfiler:
+    """
+    Семплювальний профайлер: поки виконується хоча б один профільований обробник,
+    фоновий потік кожні PROFILE_INTERVAL с записує стек потоку event loop.
+    Результат — "згорнуті" стеки (формат flamegraph.pl / speedscope).
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()
+        self._active = 0
+        self._target = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            self._active += 1
+            self._target = threading.get_ident()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+                self._thread.start()
+
+    def exit(self):
+        with self._lock:
+            self._active -= 1
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            if not self._active:
+                continue
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                with self._lock:
+                    self.samples[';'.join(reversed(stack))] += 1
+
+    def render(self, limit=200):
+        with self._lock:
+            top = self.samples.most_common(limit)
+        return '\n'.join(f"{stack} {count}" for stack, count in top) + '\n'
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import time
+
+from accounts import LEGACY_ACCOUNT
+from metrics import timed
+from rate_limit import TokenBucket
+
+# Як часто JobQueue перевіряє, чи настав час опитати якийсь чат (секунди)
+NOTIFY_TICK = 15
+# Інтервал опитування після нової пошти та максимальний інтервал для "тихих" скриньок
+MIN_INTERVAL = 60
+MAX_INTERVAL = 30 * 60
+# Загальний ліміт HTTP-запитів до Gmail API від сповіщень для всіх користувачів
+NOTIFY_CALLS_PER_MINUTE = int(os.environ.get("NOTIFY_CALLS_PER_MINUTE", 60))
+# Скільки чатів перевіряється одночасно
+NOTIFY_CONCURRENCY = 8
+# Скільки листів показувати в одному сповіщенні
+ALERT_MAX_ITEMS = 5
+
+
+class MailNotifier:
+    """
+    Фонові сповіщення про нову пошту через JobQueue.
+    Кожен підписаний чат опитується через history API (той самий курсор, що й "Оновити вхідні"):
+    після нової пошти — часто, для тихих скриньок інтервал подвоюється до MAX_INTERVAL.
+    Усі нові листи між перевірками приходять одним повідомленням.
+    Ліміт рахує кожен запит до Gmail: перед перевіркою береться один токен (history.list),
+    а решта запитів (batch, повна синхронізація) списується після неї.
+    Спільний акаунт з token.json не підтримується: його курсор один на всі чати,
+    тож сповіщення отримав би лише перший перевірений чат.
+    """
+
+    def __init__(self, db, get_gmail, sync_inbox, calls_per_minute=NOTIFY_CALLS_PER_MINUTE,
+                 min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL):
+        self.db = db
+        self.get_gmail = get_gmail
+        self.sync_inbox = sync_inbox
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.bucket = TokenBucket(calls_per_minute, per=60.0)
+        # chat_id -> [наступна перевірка (monotonic), поточний інтервал]
+        self._schedule = {}
+        self._loaded = False
+        self._running = False
+
+    async def subscribe(self, chat_id):
+        await self.db.add_subscription(chat_id)
+        self._schedule[chat_id] = [time.monotonic(), self.min_interval]
+
+    async def unsubscribe(self, chat_id):
+        await self.db.remove_subscription(chat_id)
+        self._schedule.pop(chat_id, None)
+
+    @timed('job_seconds', name='notify_tick')
+    async def tick(self, context):
+        """Обробник JobQueue: перевіряє чати, для яких настав час, у межах ліміту запитів."""
+        if self._running:
+            return
+        self._running = True
+        try:
+            if not self._loaded:
+                now = time.monotonic()
+                for chat_id in await self.db.get_subscriptions():
+                    self._schedule.setdefault(chat_id, [now, self.min_interval])
+                self._loaded = True
+
+            now = time.monotonic()
+            due = sorted((entry[0], chat_id) for chat_id, entry in self._schedule.items() if entry[0] <= now)
+            batch = []
+            for _, chat_id in due:
+                # Ліміт вичерпано (або в мінусі після дорогих перевірок) — решта чатів почекає наступного тіку
+                if not self.bucket.try_acquire():
+                    break
+                batch.append(chat_id)
+
+            semaphore = asyncio.Semaphore(NOTIFY_CONCURRENCY)
+
+            async def check(chat_id):
+                async with semaphore:
+                    await self._check_chat(context.bot, chat_id)
+
+            await asyncio.gather(*(check(chat_id) for chat_id in batch))
+        finally:
+            self._running = False
+
+    async def _check_chat(self, bot, chat_id):
+        entry = self._schedule.get(chat_id)
+        if entry is None:
+            return
+
+        new_mail = []
+        try:
+            gmail = await self.get_gmail(chat_id)
+            if gmail and gmail.account == LEGACY_ACCOUNT:
+                # Підписка, створена до того, як це заборонили: курсор спільний з іншими чатами
+                print(f"Чат {chat_id} без власного акаунта, сповіщення вимкнено.")
+                await self.unsubscribe(chat_id)
+                return
+            if gmail:
+                before = gmail.request_count
+                try:
+                    changes = await self.sync_inbox(gmail)
+                finally:
+                    # Один токен уже взято в tick
+                    self.bucket.charge(max(gmail.request_count - before - 1, 0))
+                # Повна синхронізація лише встановлює точку відліку — це не нова пошта
+                if changes and not changes['full']:
+                    new_mail = changes['added']
+        except Exception as e:
+            print(f"Помилка перевірки пошти чату {chat_id}: {e}")
+
+        if new_mail:
+            entry[1] = self.min_interval
+            try:
+                await bot.send_message(chat_id, format_alert(new_mail))
+            except Exception as e:
+                print(f"Не вдалося надіслати сповіщення чату {chat_id}: {e}")
+        else:
+            entry[1] = min(entry[1] * 2, self.max_interval)
+        entry[0] = time.monotonic() + entry[1]
+
+
+def format_alert(emails):
+    lines = [f"📬 Нових листів: {len(emails)}"]
+    for mail in emails[:ALERT_MAX_ITEMS]:
+        lines.append(f"• {mail['sender']}: {mail['subject']}")
+    if len(emails) > ALERT_MAX_ITEMS:
+        lines.append(f"…та ще {len(emails) - ALERT_MAX_ITEMS}")
+    lines.append("\nНатисніть \"Оновити вхідні\", щоб переглянути.")
+    return '\n'.join(lines)
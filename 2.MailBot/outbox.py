@@ -0,0 +1,146 @@
+import asyncio
+import random
+import time
+
+from metrics import timed
+from rate_limit import TokenBucket
+
+# Квота Gmail API — 250 одиниць/с на користувача, messages.send коштує 100: не більше 2 листів/с
+SENDS_PER_SECOND = 2
+MAX_ATTEMPTS = 6
+# Експоненційна затримка між спробами: BACKOFF_BASE * 2^n секунд, але не більше BACKOFF_MAX
+BACKOFF_BASE = 2
+BACKOFF_MAX = 10 * 60
+# Як часто перевіряти чергу, якщо нових листів не додавали (секунди)
+POLL_INTERVAL = 5
+CLAIM_BATCH = 20
+
+
+def is_retryable(error):
+    """429 і 5xx від Gmail, а також мережеві помилки (без HTTP-статусу) — тимчасові."""
+    status = getattr(getattr(error, 'resp', None), 'status', None)
+    if status is None:
+        return True
+    return int(status) == 429 or int(status) >= 500
+
+
+def backoff_delay(attempt):
+    # "Full jitter": випадкова затримка рознесе повтори різних листів у часі
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+class OutboxWorker:
+    """
+    Фоновий відправник листів з таблиці outbox.
+    Обробник лише ставить лист у чергу; воркер відправляє його з обмеженням швидкості
+    для кожного акаунта, повторює тимчасові помилки і повідомляє чат про результат.
+    """
+
+    def __init__(self, db, get_gmail):
+        self.db = db
+        self.get_gmail = get_gmail
+        self._buckets = {}
+        self._wake = asyncio.Event()
+        self._task = None
+
+    async def enqueue(self, idempotency_key, chat_id, recipient, subject, body):
+        outbox_id, created = await self.db.enqueue_outbox(idempotency_key, chat_id, recipient, subject, body)
+        self._wake.set()
+        return outbox_id, created
+
+    def start(self, bot):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run(bot))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self, bot):
+        try:
+            await self.db.reset_stale_outbox()
+        except Exception as e:
+            print(f"Помилка черги відправки: {e}")
+        while True:
+            try:
+                rows = await self.db.claim_outbox(time.time(), CLAIM_BATCH)
+            except Exception as e:
+                print(f"Помилка черги відправки: {e}")
+                rows = []
+
+            if rows:
+                await asyncio.gather(*(self._deliver_safely(bot, row) for row in rows))
+                continue
+
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver_safely(self, bot, row):
+        """
+        Помилка одного листа (наприклад, SQLite у finish_outbox) не повинна зупиняти воркер.
+        Лист повертається в чергу: якщо його вже відправлено, наступна спроба знайде його в "Надісланих".
+        """
+        try:
+            await self._deliver(bot, row)
+        except Exception as e:
+            print(f"Помилка відправки листа {row['id']}: {e}")
+            try:
+                # Як і тимчасові помилки Gmail: після MAX_ATTEMPTS лист позначається 'failed', а чат дізнається про це
+                await self._retry_or_fail(bot, row, str(e))
+            except Exception as e:
+                # Лист лишиться в 'sending' до перезапуску (reset_stale_outbox)
+                print(f"Не вдалося повернути лист {row['id']} у чергу: {e}")
+
+    @timed('outbox_delivery_seconds')
+    async def _deliver(self, bot, row):
+        gmail = await self.get_gmail(row['chat_id'])
+        if not gmail:
+            await self._retry_or_fail(bot, row, "немає доступу до пошти")
+            return
+
+        # Кожен лист має Message-ID з ключа ідемпотентності
+        message_id = f"<{row['key']}@mailbot>"
+        try:
+            gmail_id = None
+            if row['attempts'] > 1:
+                # Попередня спроба могла дійти до Gmail — перевіряємо "Надіслані", щоб не відправити двічі
+                gmail_id = await gmail.find_sent_message(message_id)
+            if gmail_id is None:
+                bucket = self._buckets.setdefault(gmail.account, TokenBucket(SENDS_PER_SECOND, per=1.0))
+                await bucket.acquire()
+                sent = await gmail.send_message(row['recipient'], row['subject'], row['body'], message_id)
+                gmail_id = sent.get('id')
+        except Exception as e:
+            if is_retryable(e):
+                await self._retry_or_fail(bot, row, str(e))
+            else:
+                await self._fail(bot, row, str(e))
+            return
+
+        await self.db.finish_outbox(row['id'], 'sent', gmail_id=gmail_id)
+        await notify(bot, row['chat_id'], f"Лист для {row['recipient']} відправлено.")
+
+    async def _retry_or_fail(self, bot, row, error):
+        if row['attempts'] >= MAX_ATTEMPTS:
+            await self._fail(bot, row, error)
+            return
+        await self.db.retry_outbox(row['id'], time.time() + backoff_delay(row['attempts']), error)
+
+    async def _fail(self, bot, row, error):
+        await self.db.finish_outbox(row['id'], 'failed', error=error)
+        await notify(bot, row['chat_id'], f"Не вдалося відправити лист для {row['recipient']}: {error}")
+
+
+async def notify(bot, chat_id, text):
+    try:
+        await bot.send_message(chat_id, text)
+    except Exception as e:
+        print(f"Не вдалося надіслати повідомлення чату {chat_id}: {e}")
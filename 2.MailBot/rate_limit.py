@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket: у середньому не більше rate дій за per секунд,
+    з можливістю короткого сплеску до capacity дій.
+    """
+
+    def __init__(self, rate, per=60.0, capacity=None):
+        self.rate = rate / per
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """Забирає токени, якщо вони є; інакше повертає False без очікування."""
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def charge(self, tokens):
+        """
+        Списує токени без перевірки: для витрат, відомих лише після дії.
+        Баланс може піти в мінус — тоді наступні дії чекають, доки борг не покриється.
+        """
+        self._refill()
+        self._tokens -= tokens
+
+    async def acquire(self, tokens=1):
+        """Чекає, поки з'являться токени, і забирає їх."""
+        while not self.try_acquire(tokens):
+            await asyncio.sleep((tokens - self._tokens) / self.rate)
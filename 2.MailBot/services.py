@@ -0,0 +1,22 @@
+from accounts import GmailPool
+from message_cache import MessageCache
+
+# Кеш тексту листів не потребує мережі, тому створюється одразу
+message_cache = MessageCache()
+# Клієнти Gmail (імпорт бібліотек Google, авторизація, build) створюються при першому зверненні
+gmail_pool = GmailPool(cache=message_cache)
+
+
+async def get_gmail(chat_id):
+    """Повертає AsyncGmailService для чату; None — якщо авторизація не вдалася."""
+    return await gmail_pool.get(chat_id)
+
+
+async def get_account(chat_id):
+    """Ключ акаунта чату в локальній БД; не потребує авторизації в Gmail."""
+    return await gmail_pool.account_key(chat_id)
+
+
+async def warm_up():
+    """Фоновий прогрів: створює спільний клієнт Gmail до першого запиту користувача."""
+    await gmail_pool.get_legacy()
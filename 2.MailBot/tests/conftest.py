@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_manager  # noqa: E402
+import gmail_service  # noqa: E402
+from gmail_service import GmailService, load_discovery_document  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def discovery_file(tmp_path_factory, monkeypatch):
+    """Кеш discovery-документа — у тимчасовій теці, а не поруч із кодом."""
+    monkeypatch.setattr(gmail_service, 'DISCOVERY_FILE',
+                        str(tmp_path_factory.getbasetemp() / 'gmail_discovery.json'))
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Окрема SQLite-база для кожного тесту."""
+    db_manager.close_db()
+    monkeypatch.setattr(db_manager, 'DB_NAME', str(tmp_path / 'emails.db'))
+    db_manager.init_db()
+    yield db_manager
+    db_manager.close_db()
+
+
+@pytest.fixture
+def make_gmail(monkeypatch):
+    """GmailService без OAuth, що ходить у переданий фейковий транспорт."""
+    from googleapiclient.discovery import build_from_document
+
+    monkeypatch.setattr(GmailService, 'authenticate', lambda self, token_json=None: None)
+
+    def factory(http, cache=None):
+        service = GmailService(cache=cache)
+        service.service = build_from_document(load_discovery_document(), http=http)
+        service._http = lambda: http
+        return service
+
+    return factory
@@ -0,0 +1,75 @@
+import json
+import re
+import threading
+from urllib.parse import urlsplit, parse_qs
+
+import httplib2
+
+BATCH_PATH = '/batch'
+MESSAGES_RE = re.compile(r'/gmail/v1/users/me/messages(?:/([^/?]+))?$')
+
+
+def _message(msg_id):
+    return {
+        'id': msg_id,
+        'snippet': f'snippet {msg_id}',
+        'internalDate': '1700000000000',
+        'payload': {'headers': [{'name': 'From', 'value': f'{msg_id}@example.com'},
+                                {'name': 'Subject', 'value': f'Subject {msg_id}'}]},
+    }
+
+
+class FakeGmailHttp:
+    """
+    Фейковий транспорт Gmail API замість httplib2.Http: відповідає на messages.list,
+    messages.get і batch-запити та рахує кожен HTTP round-trip.
+    failing — ID листів, для яких частина batch-відповіді повертає 429.
+    """
+
+    def __init__(self, message_ids, failing=()):
+        self.message_ids = list(message_ids)
+        self.failing = set(failing)
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=None, connection_type=None):
+        path = urlsplit(uri).path
+        with self._lock:
+            self.requests.append((method, path))
+        if path == BATCH_PATH:
+            return self._batch(body, headers)
+        status, payload = self._handle(method, uri)
+        return httplib2.Response({'status': status, 'content-type': 'application/json'}), \
+            json.dumps(payload).encode('utf-8')
+
+    def _handle(self, method, uri):
+        parts = urlsplit(uri)
+        match = MESSAGES_RE.search(parts.path)
+        if not match:
+            return 404, {'error': {'code': 404, 'message': 'not found'}}
+        if match.group(1):
+            return 200, _message(match.group(1))
+        count = int(parse_qs(parts.query).get('maxResults', ['100'])[0])
+        return 200, {'messages': [{'id': msg_id} for msg_id in self.message_ids[:count]]}
+
+    def _batch(self, body, headers):
+        boundary = 'fake_batch_boundary'
+        parts = []
+        # Кожна частина запиту: Content-ID і рядок "GET /gmail/v1/... HTTP/1.1"
+        for content_id, request_line in re.findall(r'Content-ID: <([^>]+)>.*?\n(GET \S+)', body, re.DOTALL):
+            uri = 'https://gmail.googleapis.com' + request_line.split(' ', 1)[1]
+            msg_id = MESSAGES_RE.search(urlsplit(uri).path).group(1)
+            if msg_id in self.failing:
+                status_line, payload = 'HTTP/1.1 429 Too Many Requests', {'error': {'code': 429}}
+            else:
+                status, payload = self._handle('GET', uri)
+                status_line = f'HTTP/1.1 {status} OK'
+            parts.append(
+                f'--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n'
+                f'{status_line}\r\nContent-Type: application/json\r\n\r\n{json.dumps(payload)}\r\n')
+        content = ''.join(parts) + f'--{boundary}--\r\n'
+        response = httplib2.Response({'status': 200, 'content-type': f'multipart/mixed; boundary={boundary}'})
+        return response, content.encode('utf-8')
+
+    def count(self, path_suffix):
+        return sum(1 for _, path in self.requests if path.endswith(path_suffix))
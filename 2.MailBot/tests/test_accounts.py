@@ -0,0 +1,68 @@
+import asyncio
+import gc
+import tracemalloc
+import weakref
+
+import accounts
+from message_cache import MessageCache
+
+ACCOUNTS = 300
+POOL_SIZE = 50
+# Кожен фейковий клієнт тримає стільки пам'яті, щоб витік був помітний
+CLIENT_BYTES = 256 * 1024
+
+
+class FakeGmailService:
+    instances = weakref.WeakSet()
+
+    def __init__(self, cache=None, token_json=None, account='me'):
+        self.account = account
+        self.buffer = bytearray(CLIENT_BYTES)
+        FakeGmailService.instances.add(self)
+
+
+def test_pool_stays_bounded_with_hundreds_of_accounts(db, monkeypatch):
+    monkeypatch.setattr(accounts, 'GmailService', FakeGmailService)
+    for chat_id in range(1, ACCOUNTS + 1):
+        db.save_account(chat_id, '{"token": "fake"}', f'user{chat_id}@example.com')
+
+    pool = accounts.GmailPool(max_size=POOL_SIZE)
+
+    async def load(chat_ids):
+        for chat_id in chat_ids:
+            client = await pool.get(chat_id)
+            assert client.account == str(chat_id)
+        return client
+
+    tracemalloc.start()
+    try:
+        asyncio.run(load(range(1, POOL_SIZE + 1)))
+        gc.collect()
+        full_pool, _ = tracemalloc.get_traced_memory()
+
+        last = asyncio.run(load(range(POOL_SIZE + 1, ACCOUNTS + 1)))
+        gc.collect()
+        after_all, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert len(pool) == POOL_SIZE
+    # Витіснені клієнти звільнено: живих екземплярів не більше за розмір пулу
+    assert len(FakeGmailService.instances) <= POOL_SIZE
+    # Ще 250 акаунтів не збільшили пам'ять більше ніж на кілька клієнтів
+    assert after_all - full_pool < 5 * CLIENT_BYTES
+    # Недавній чат береться з пулу, а не створюється знову
+    assert asyncio.run(pool.get(ACCOUNTS)) is last
+
+
+def test_message_cache_forgets_account(db):
+    cache = MessageCache()
+    cache.put('123', 'm1', 'текст чату')
+    cache.put('me', 'm1', 'спільний текст')
+
+    cache.forget_account('123')
+    db.delete_account(123)
+
+    assert cache.get('123', 'm1') is None
+    assert cache.get('me', 'm1') == 'спільний текст'
+    assert cache.snapshot()['memory_items'] == 1
@@ -0,0 +1,52 @@
+import sqlite3
+import time
+from datetime import datetime
+
+ROWS = 2000
+
+
+def save_email_per_row(db_name, gmail_id, sender, subject, snippet, folder='INBOX'):
+    """Попередня реалізація db_manager.save_email: з'єднання і commit на кожен лист."""
+    conn = sqlite3.connect(db_name)
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''
+            INSERT OR IGNORE INTO emails (gmail_id, sender, subject, body, folder, received_date)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (gmail_id, sender, subject, snippet, folder, datetime.now()))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def make_emails(count):
+    return [{'id': f'm{i}', 'sender': f'user{i}@example.com', 'subject': f'Тема {i}',
+             'snippet': 'Короткий зміст листа ' * 3, 'date': datetime(2024, 1, 1)} for i in range(count)]
+
+
+def test_bulk_save_is_faster_than_per_row(db, tmp_path):
+    emails = make_emails(ROWS)
+
+    old_db = str(tmp_path / 'old.db')
+    with sqlite3.connect(old_db) as conn:
+        conn.execute('''
+            CREATE TABLE emails (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, gmail_id TEXT UNIQUE, sender TEXT, recipient TEXT,
+                subject TEXT, body TEXT, folder TEXT, received_date TIMESTAMP
+            )
+        ''')
+    start = time.perf_counter()
+    for mail in emails:
+        save_email_per_row(old_db, mail['id'], mail['sender'], mail['subject'], mail['snippet'])
+    per_row = ROWS / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    # Сторінками по 100, як їх зберігає синхронізація
+    for i in range(0, ROWS, 100):
+        db.save_emails(emails[i:i + 100])
+    bulk = ROWS / (time.perf_counter() - start)
+
+    print(f"\nsave_email по одному: {per_row:.0f} рядків/с, save_emails сторінками: {bulk:.0f} рядків/с "
+          f"({bulk / per_row:.1f}x)")
+    assert len(db.get_emails_page(limit=ROWS + 1)) == ROWS
+    assert bulk > per_row * 3
@@ -0,0 +1,72 @@
+import sqlite3
+from datetime import datetime
+
+import db_manager
+
+
+def mails(count, prefix='m'):
+    return [{'id': f'{prefix}{i}', 'sender': 's@example.com', 'subject': f'Тема {i}', 'snippet': f'текст {i}',
+             'date': datetime(2024, 1, 1, 0, i)} for i in range(count)]
+
+
+def full_sync(emails):
+    return {'history_id': '10', 'added': emails, 'deleted': [], 'full': True}
+
+
+def test_same_mailbox_on_two_accounts_is_stored_separately(db):
+    shared = mails(20)
+    db.apply_sync_changes(full_sync(shared), account='me')
+    db.apply_sync_changes(full_sync(shared[:3]), account='123')
+
+    assert len(db.get_emails_page('me', limit=100)) == 20
+    assert len(db.get_emails_page('123', limit=100)) == 3
+
+    db.delete_account(123)
+    assert len(db.get_emails_page('me', limit=100)) == 20
+    assert db.get_emails_page('123', limit=100) == []
+    assert len(db.search_emails('Тема', limit=100, account='me')) == 20
+
+
+def test_delete_account_removes_message_bodies(db):
+    db.save_account(123, '{}', 'user@example.com')
+    db.save_message_body('123', 'm1', 'секрет')
+    db.save_message_body('me', 'm1', 'спільний')
+
+    db.delete_account(123)
+
+    assert db.get_message_body('123', 'm1') is None
+    assert db.get_message_body('me', 'm1') == 'спільний'
+
+
+def test_legacy_schema_is_migrated(tmp_path, monkeypatch):
+    path = tmp_path / 'old.db'
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE emails (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, gmail_id TEXT UNIQUE, sender TEXT, recipient TEXT,
+            subject TEXT, body TEXT, folder TEXT, received_date TIMESTAMP
+        )
+    ''')
+    conn.execute("CREATE TABLE message_bodies (gmail_id TEXT PRIMARY KEY, body TEXT, cached_at TIMESTAMP)")
+    conn.execute("INSERT INTO emails (gmail_id, sender, subject, body, folder, received_date) "
+                 "VALUES ('old1', 'a@example.com', 'Стара тема', 'старий текст', 'INBOX', '2023-01-01 00:00:00.000000')")
+    conn.execute("INSERT INTO message_bodies VALUES ('old1', 'тіло', '2023-01-01')")
+    conn.commit()
+    conn.close()
+
+    db_manager.close_db()
+    monkeypatch.setattr(db_manager, 'DB_NAME', str(path))
+    try:
+        db_manager.init_db()
+        assert [mail['id'] for mail in db_manager.get_emails_page('me')] == ['old1']
+        assert db_manager.search_emails('Стара')[0]['id'] == 'old1'
+
+        # Після міграції той самий лист можна зберегти для іншого акаунта
+        db_manager.apply_sync_changes(full_sync(mails(1, 'old')), account='123')
+        assert len(db_manager.get_emails_page('me')) == 1
+        assert len(db_manager.get_emails_page('123')) == 1
+
+        db_manager.save_message_body('123', 'old1', 'нове тіло')
+        assert db_manager.get_message_body('123', 'old1') == 'нове тіло'
+    finally:
+        db_manager.close_db()
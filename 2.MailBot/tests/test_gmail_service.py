@@ -0,0 +1,63 @@
+from fake_gmail import FakeGmailHttp
+
+
+def test_list_page_makes_two_round_trips(make_gmail):
+    http = FakeGmailHttp([f'm{i}' for i in range(5)])
+    gmail = make_gmail(http)
+
+    page = gmail.list_page('INBOX', count=5)
+
+    assert [mail['id'] for mail in page['emails']] == ['m0', 'm1', 'm2', 'm3', 'm4']
+    assert page['emails'][0]['subject'] == 'Subject m0'
+    # messages.list + один batch на всі 5 листів
+    assert len(http.requests) == 2
+    assert http.count('/batch') == 1
+
+
+def test_latest_emails_make_two_round_trips(make_gmail):
+    http = FakeGmailHttp([f'm{i}' for i in range(5)])
+
+    emails = make_gmail(http).get_latest_emails(5)
+
+    assert [mail['id'] for mail in emails] == ['m0', 'm1', 'm2', 'm3', 'm4']
+    assert len(http.requests) == 2
+
+
+def test_metadata_batches_of_fifty(make_gmail):
+    ids = [f'm{i}' for i in range(120)]
+    http = FakeGmailHttp(ids)
+
+    emails = make_gmail(http).get_emails_metadata(ids)
+
+    assert [mail['id'] for mail in emails] == ids
+    assert http.count('/batch') == 3
+    assert len(http.requests) == 3
+
+
+def test_failed_batch_parts_fall_back_to_single_requests(make_gmail):
+    ids = [f'm{i}' for i in range(10)]
+    http = FakeGmailHttp(ids, failing={'m3', 'm7'})
+
+    emails = make_gmail(http).get_emails_metadata(ids)
+
+    # Порядок ids зберігається, а відмови довантажено поштучно
+    assert [mail['id'] for mail in emails] == ids
+    assert http.count('/batch') == 1
+    assert http.count('/messages/m3') == 1
+    assert http.count('/messages/m7') == 1
+    assert len(http.requests) == 3
+
+
+def test_whole_batch_failure_uses_concurrent_fetch(make_gmail, monkeypatch):
+    ids = [f'm{i}' for i in range(6)]
+    http = FakeGmailHttp(ids)
+    gmail = make_gmail(http)
+
+    def broken_batch(_):
+        raise RuntimeError("batch unavailable")
+
+    monkeypatch.setattr(gmail, '_fetch_metadata_batch', broken_batch)
+    emails = gmail.get_emails_metadata(ids)
+
+    assert [mail['id'] for mail in emails] == ids
+    assert len(http.requests) == 6
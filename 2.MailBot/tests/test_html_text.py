@@ -0,0 +1,37 @@
+import base64
+
+from html_text import html_to_text, iter_base64_text
+
+
+def test_inline_tags_keep_spaces_between_words():
+    text, truncated = html_to_text(['<p>Hello <b>John</b> <i>Smith</i>, welcome</p>'])
+    assert text == 'Hello John Smith, welcome'
+    assert not truncated
+
+
+def test_skipped_tags_and_blocks():
+    html = '<head><style>p {}</style></head><body><p>One</p><div>Two<br>Three</div><script>x()</script></body>'
+    assert html_to_text([html]) == ('One\n\nTwo\nThree', False)
+
+
+def test_empty_blocks_do_not_use_up_the_limit():
+    # Верстка з тисяч порожніх блоків не повинна витісняти зміст листа за ліміт
+    html = '<table>' + '<tr><td><div></div></td></tr>' * 1100 + '<p>Important content here</p>'
+    assert html_to_text([html], max_chars=4000) == ('Important content here', False)
+
+
+def test_truncated_on_visible_length():
+    html = '<p>слово</p>' * 1000 + '<p>tail</p>'
+    text, truncated = html_to_text([html], max_chars=4000)
+    assert truncated
+    assert 'tail' not in text
+    # Розбір зупиняється одразу за лімітом видимого тексту
+    assert 4000 < len(text) <= 4000 + len('слово\n\n')
+
+
+def test_streams_base64_chunks():
+    html = ('<p>Привіт, світ</p>' * 3000).encode('utf-8')
+    data = base64.urlsafe_b64encode(html).decode().rstrip('=')
+    text, truncated = html_to_text(iter_base64_text(data, chunk_size=1024))
+    assert text.count('Привіт, світ') == 3000
+    assert not truncated
@@ -0,0 +1,94 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+
+import interface
+from async_service import AsyncGmailService, GMAIL_WORKERS
+
+CHATS = 50
+# Затримка одного виклику фейкового Gmail (блокуючий виклик у потоці, як у googleapiclient)
+GMAIL_LATENCY = 0.05
+
+
+class SlowGmail:
+    """Синхронний фейковий GmailService: кожен виклик блокує потік на GMAIL_LATENCY."""
+
+    def __init__(self, account):
+        self.account = account
+
+    def sync_changes(self, history_id=None, label='INBOX', count=5):
+        time.sleep(GMAIL_LATENCY)
+        return {
+            'history_id': '1',
+            'added': [{'id': f'{self.account}-{i}', 'sender': 'a@example.com', 'subject': f'Лист {i}',
+                       'snippet': '', 'date': datetime(2024, 1, 1, 12, i)} for i in range(5)],
+            'deleted': [],
+            'full': True,
+        }
+
+
+def fake_update(chat_id, replies):
+    async def reply_text(text, **kwargs):
+        replies.append((chat_id, text))
+
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id),
+                           message=SimpleNamespace(reply_text=reply_text))
+
+
+def fake_context():
+    return SimpleNamespace(user_data={}, application=SimpleNamespace(create_task=asyncio.ensure_future))
+
+
+def test_fifty_concurrent_chats(db, monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=GMAIL_WORKERS)
+    services = {chat_id: AsyncGmailService(SlowGmail(str(chat_id)), executor, account=str(chat_id))
+                for chat_id in range(1, CHATS + 1)}
+
+    async def get_gmail(chat_id):
+        return services[chat_id]
+
+    monkeypatch.setattr(interface, 'get_gmail', get_gmail)
+    replies = []
+
+    async def timed_check(chat_id):
+        start = time.perf_counter()
+        await interface.check_inbox(fake_update(chat_id, replies), fake_context())
+        return time.perf_counter() - start
+
+    async def heartbeat(stop):
+        # Найбільша затримка event loop, поки працюють обробники
+        worst = 0.0
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            worst = max(worst, time.perf_counter() - start - 0.005)
+        return worst
+
+    async def main():
+        stop = asyncio.Event()
+        lag_task = asyncio.create_task(heartbeat(stop))
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(timed_check(chat_id) for chat_id in services))
+        total = time.perf_counter() - start
+        stop.set()
+        return latencies, total, await lag_task
+
+    try:
+        latencies, total, loop_lag = asyncio.run(main())
+    finally:
+        executor.shutdown()
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    p50, p99 = quantiles[49], quantiles[98]
+    print(f"\n{CHATS} чатів: усього {total:.2f} с, p50 {p50 * 1000:.0f} мс, p99 {p99 * 1000:.0f} мс, "
+          f"найбільша затримка event loop {loop_lag * 1000:.0f} мс")
+
+    # Кожен чат отримав свій список листів
+    assert sum(1 for _, text in replies if 'Список останніх повідомлень' in text) == CHATS
+    # Послідовно це зайняло б CHATS * GMAIL_LATENCY = 2.5 с; пул з GMAIL_WORKERS потоків — приблизно в 8 разів менше
+    assert p99 < CHATS * GMAIL_LATENCY / 2
+    # Блокуючі виклики не зупиняють event loop
+    assert loop_lag < GMAIL_LATENCY
@@ -0,0 +1,44 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+from telegram import Chat, Message, Update
+
+import interface
+
+
+def login_handler(application):
+    return next(handler for handler in application.handlers[0]
+                if getattr(handler, 'callback', None) is interface.login_redirect)
+
+
+def redirect_update(text):
+    return Update(1, message=Message(1, datetime.now(), Chat(1, 'private'), text=text))
+
+
+def test_redirect_filter_follows_configured_uri(monkeypatch):
+    monkeypatch.setattr(interface, 'OAUTH_REDIRECT_URI', 'https://bot.example.com/oauth/')
+    handler = login_handler(interface.build_application('123:TEST'))
+
+    assert handler.check_update(redirect_update('https://bot.example.com/oauth?state=s&code=c'))
+    assert not handler.check_update(redirect_update('http://localhost/?state=s&code=c'))
+    # Крапка в адресі — буквальна, а не будь-який символ
+    assert not handler.check_update(redirect_update('https://botXexample.com/oauth?code=c'))
+
+
+def test_redirect_message_is_deleted():
+    deleted, replies = [], []
+
+    async def delete():
+        deleted.append(True)
+
+    async def reply_text(text, **kwargs):
+        replies.append(text)
+
+    update = SimpleNamespace(effective_chat=SimpleNamespace(id=1),
+                             message=SimpleNamespace(text='http://localhost/?code=secret', delete=delete,
+                                                     reply_text=reply_text))
+    asyncio.run(interface.login_redirect(update, SimpleNamespace(chat_data={})))
+
+    assert deleted
+    assert replies == ["Спочатку виконайте /login."]
@@ -0,0 +1,108 @@
+import asyncio
+from types import SimpleNamespace
+
+import notifier as notifier_module
+import rate_limit
+from accounts import LEGACY_ACCOUNT
+from notifier import MailNotifier, NOTIFY_TICK
+
+
+class FakeDB:
+    """Підписки в пам'яті замість AsyncDB."""
+
+    def __init__(self, chats):
+        self.subscriptions = set(chats)
+
+    async def get_subscriptions(self):
+        return sorted(self.subscriptions)
+
+    async def add_subscription(self, chat_id):
+        self.subscriptions.add(chat_id)
+
+    async def remove_subscription(self, chat_id):
+        self.subscriptions.discard(chat_id)
+
+
+class FakeGmail:
+    """Клієнт, одна синхронізація якого коштує calls запитів до Gmail API."""
+
+    def __init__(self, account, calls):
+        self.account = account
+        self.calls = calls
+        self.request_count = 0
+
+
+def make_notifier(gmails, calls_per_minute):
+    async def get_gmail(chat_id):
+        return gmails[chat_id]
+
+    async def sync_inbox(gmail):
+        gmail.request_count += gmail.calls
+        return {'added': [], 'deleted': [], 'full': False}
+
+    return MailNotifier(FakeDB(gmails), get_gmail, sync_inbox, calls_per_minute=calls_per_minute)
+
+
+def test_bucket_is_charged_per_gmail_request():
+    # Кожна перевірка коштує 3 запити (history.list + batch + повторна сторінка)
+    gmails = {chat_id: FakeGmail(str(chat_id), calls=3) for chat_id in range(1, 11)}
+    notifier = make_notifier(gmails, calls_per_minute=12)
+    context = SimpleNamespace(bot=None)
+
+    asyncio.run(notifier.tick(context))
+    first = sum(gmail.request_count for gmail in gmails.values())
+    # Перевірки в межах одного тіку беруть по токену наперед, тож перевищення не більше за тік
+    assert first <= 12 * 3
+
+    # Борг за додаткові запити не дає наступному тіку опитати ще хоч когось
+    for entry in notifier._schedule.values():
+        entry[0] = 0
+    asyncio.run(notifier.tick(context))
+    assert sum(gmail.request_count for gmail in gmails.values()) == first
+    assert notifier.bucket.try_acquire() is False
+
+
+def test_shared_account_subscription_is_dropped():
+    gmails = {1: FakeGmail(LEGACY_ACCOUNT, calls=1), 2: FakeGmail('2', calls=1)}
+    notifier = make_notifier(gmails, calls_per_minute=60)
+
+    asyncio.run(notifier.tick(SimpleNamespace(bot=None)))
+
+    assert notifier.db.subscriptions == {2}
+    assert gmails[1].request_count == 0
+    assert gmails[2].request_count == 1
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def test_idle_mailboxes_cost_a_handful_of_calls(monkeypatch):
+    clock = FakeClock()
+    # Один годинник для розкладу перевірок і для ліміту запитів
+    monkeypatch.setattr(notifier_module.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(rate_limit.time, 'monotonic', clock.monotonic)
+    gmails = {chat_id: FakeGmail(str(chat_id), calls=1) for chat_id in range(1, 101)}
+    notifier = make_notifier(gmails, calls_per_minute=60)
+    context = SimpleNamespace(bot=None)
+
+    hours = 6
+    ticks = hours * 3600 // NOTIFY_TICK
+
+    async def simulate():
+        for _ in range(ticks):
+            await notifier.tick(context)
+            clock.now += NOTIFY_TICK
+
+    asyncio.run(simulate())
+
+    calls = [gmail.request_count for gmail in gmails.values()]
+    print(f"\n{hours} год, {len(gmails)} тихих скриньок: {min(calls)}-{max(calls)} запитів на скриньку "
+          f"(опитування кожного тіку — {ticks})")
+    # Інтервал подвоюється до MAX_INTERVAL: 60, 120, ... 1800 с, далі раз на півгодини
+    assert max(calls) <= 20
+    assert min(calls) >= 10
@@ -0,0 +1,146 @@
+import asyncio
+import random
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import outbox
+from async_service import AsyncDB
+
+ACCOUNTS = 10
+PER_ACCOUNT = 20
+# Частка відмов Gmail (429) і помилок SQLite у finish_outbox
+SEND_FAILURE_RATE = 0.2
+DB_FAILURE_RATE = 0.1
+
+
+class RateLimited(Exception):
+    resp = SimpleNamespace(status=429)
+
+
+class FakeGmail:
+    """Акаунт, що іноді відповідає 429; "Надіслані" спільні для всіх акаунтів тесту."""
+
+    def __init__(self, account, sent, rng):
+        self.account = account
+        self.sent = sent
+        self.rng = rng
+        self.rejected = 0
+
+    async def find_sent_message(self, message_id):
+        return message_id if message_id in self.sent else None
+
+    async def send_message(self, recipient, subject, message_text, message_id=None):
+        await asyncio.sleep(0)
+        if self.rng.random() < SEND_FAILURE_RATE:
+            self.rejected += 1
+            raise RateLimited("429 Too Many Requests")
+        self.sent.append(message_id)
+        return {'id': message_id}
+
+
+class FaultyDB:
+    """AsyncDB, у якому finish_outbox іноді падає з помилкою SQLite вже після відправки листа."""
+
+    def __init__(self, rng):
+        self._db = AsyncDB()
+        self.rng = rng
+        self.injected = 0
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+    async def finish_outbox(self, *args, **kwargs):
+        if self.rng.random() < DB_FAILURE_RATE:
+            self.injected += 1
+            raise sqlite3.OperationalError("database is locked")
+        return await self._db.finish_outbox(*args, **kwargs)
+
+
+def count_sent(db):
+    return db.get_connection().execute("SELECT COUNT(*) FROM outbox WHERE status = 'sent'").fetchone()[0]
+
+
+def test_worker_survives_injected_faults(db, monkeypatch):
+    monkeypatch.setattr(outbox, 'SENDS_PER_SECOND', 1000)
+    monkeypatch.setattr(outbox, 'BACKOFF_BASE', 0.01)
+    monkeypatch.setattr(outbox, 'BACKOFF_MAX', 0.05)
+    monkeypatch.setattr(outbox, 'POLL_INTERVAL', 0.02)
+    monkeypatch.setattr(outbox, 'MAX_ATTEMPTS', 100)
+    rng = random.Random(13)
+    sent = []
+    gmails = {chat_id: FakeGmail(str(chat_id), sent, rng) for chat_id in range(1, ACCOUNTS + 1)}
+    total = ACCOUNTS * PER_ACCOUNT
+
+    async def get_gmail(chat_id):
+        return gmails[chat_id]
+
+    async def send_chat_message(chat_id, text):
+        pass
+
+    async def main():
+        fdb = FaultyDB(rng)
+        worker = outbox.OutboxWorker(fdb, get_gmail)
+        for chat_id in gmails:
+            for i in range(PER_ACCOUNT):
+                await worker.enqueue(f'{chat_id}-{i}', chat_id, 'to@example.com', f'Лист {i}', 'текст')
+
+        start = time.perf_counter()
+        worker.start(SimpleNamespace(send_message=send_chat_message))
+        deadline = start + 10
+        while time.perf_counter() < deadline:
+            if count_sent(db) == total:
+                break
+            await asyncio.sleep(0.02)
+        elapsed = time.perf_counter() - start
+        alive = not worker._task.done()
+        # Якщо воркер упав, stop() підняв би збережений виняток
+        await worker.stop()
+        fdb.close()
+        return elapsed, alive, fdb.injected
+
+    elapsed, alive, injected = asyncio.run(main())
+    rejected = sum(gmail.rejected for gmail in gmails.values())
+    print(f"\n{total} листів за {elapsed:.2f} с ({total / elapsed:.0f} лист/с), "
+          f"відмов Gmail: {rejected}, помилок SQLite: {injected}")
+
+    assert alive
+    assert injected > 0 and rejected > 0
+    # Відмови лише відкладають окремі листи, а не зупиняють чергу
+    assert total / elapsed > 100
+    rows = db.get_connection().execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+    assert rows == [('sent', total)]
+    # Лист, відправлений перед помилкою SQLite, не відправляється вдруге
+    assert len(sent) == len(set(sent)) == total
+
+
+def test_row_that_keeps_raising_is_failed_after_max_attempts(db, monkeypatch):
+    monkeypatch.setattr(outbox, 'BACKOFF_BASE', 0.001)
+    monkeypatch.setattr(outbox, 'BACKOFF_MAX', 0.005)
+    monkeypatch.setattr(outbox, 'POLL_INTERVAL', 0.01)
+    calls, notices = [], []
+
+    async def broken_gmail(chat_id):
+        calls.append(chat_id)
+        raise sqlite3.OperationalError("no such table: accounts")
+
+    async def send_chat_message(chat_id, text):
+        notices.append((chat_id, text))
+
+    async def main():
+        adb = AsyncDB()
+        worker = outbox.OutboxWorker(adb, broken_gmail)
+        await worker.enqueue('key-1', 7, 'to@example.com', 'Тема', 'текст')
+        worker.start(SimpleNamespace(send_message=send_chat_message))
+        deadline = time.perf_counter() + 5
+        while not notices and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        await worker.stop()
+        adb.close()
+
+    asyncio.run(main())
+
+    status = db.get_connection().execute("SELECT status, attempts FROM outbox").fetchone()
+    assert status == ('failed', outbox.MAX_ATTEMPTS)
+    assert len(calls) == outbox.MAX_ATTEMPTS
+    assert notices and notices[0][0] == 7 and 'Не вдалося відправити' in notices[0][1]
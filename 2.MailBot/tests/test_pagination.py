@@ -0,0 +1,53 @@
+import time
+from datetime import datetime, timedelta
+
+ROWS = 50_000
+PAGE = 5
+DEPTHS = [0, 1_000, 10_000, 45_000]
+REPEAT = 20
+
+
+def offset_page(db, account, folder, limit, offset):
+    """Те саме сортування, що й get_emails_page, але з OFFSET замість курсора."""
+    return db.get_connection().execute('''
+        SELECT gmail_id, sender, subject, body, received_date, id FROM emails
+        WHERE account = ? AND folder = ?
+        ORDER BY received_date DESC, id DESC
+        LIMIT ? OFFSET ?
+    ''', (account, folder, limit, offset)).fetchall()
+
+
+def best_of(func):
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def test_keyset_page_latency_is_flat(db):
+    start = datetime(2024, 1, 1)
+    emails = [{'id': f'm{i}', 'sender': 'a@example.com', 'subject': f'Лист {i}', 'snippet': '',
+               'date': start + timedelta(minutes=i)} for i in range(ROWS)]
+    for i in range(0, ROWS, 1000):
+        db.save_emails(emails[i:i + 1000])
+
+    # Курсор на кожній глибині — останній лист попередньої сторінки, як у "Далі ▶️"
+    ordered = db.get_emails_page('me', 'INBOX', ROWS)
+    keyset, offset = {}, {}
+    for depth in DEPTHS:
+        before = ordered[depth - 1]['cursor'] if depth else None
+        page = db.get_emails_page('me', 'INBOX', PAGE, before)
+        assert [mail['id'] for mail in page] == [row[0] for row in offset_page(db, 'me', 'INBOX', PAGE, depth)]
+        keyset[depth] = best_of(lambda: db.get_emails_page('me', 'INBOX', PAGE, before))
+        offset[depth] = best_of(lambda: offset_page(db, 'me', 'INBOX', PAGE, depth))
+
+    print()
+    for depth in DEPTHS:
+        print(f"глибина {depth:>6}: keyset {keyset[depth] * 1e6:7.0f} мкс, OFFSET {offset[depth] * 1e6:7.0f} мкс")
+
+    deepest = DEPTHS[-1]
+    # Keyset не залежить від глибини, OFFSET проходить усі пропущені рядки
+    assert keyset[deepest] < keyset[0] * 5
+    assert offset[deepest] > keyset[deepest] * 10
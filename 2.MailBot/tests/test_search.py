@@ -0,0 +1,64 @@
+import asyncio
+import statistics
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import interface
+import services
+
+CORPUS = 100_000
+WORDS = ['рахунок', 'зустріч', 'звіт', 'відпустка', 'договір', 'invoice', 'meeting', 'report', 'deploy', 'release']
+
+
+def make_corpus(count):
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        word = WORDS[i % len(WORDS)]
+        yield {'id': f'{i:016x}', 'sender': f'user{i % 500}@example.com', 'subject': f'{word} №{i}',
+               'snippet': f'Текст листа {i} про {word} та {WORDS[(i * 7) % len(WORDS)]}',
+               'date': start + timedelta(minutes=i)}
+
+
+def test_search_over_100k_messages(db):
+    corpus = list(make_corpus(CORPUS))
+    start = time.perf_counter()
+    for i in range(0, CORPUS, 1000):
+        db.save_emails(corpus[i:i + 1000])
+    load = time.perf_counter() - start
+
+    latencies = []
+    for query in WORDS + ['звіт договір', 'user42', 'meeting 777']:
+        start = time.perf_counter()
+        results = db.search_emails(query, limit=6)
+        latencies.append(time.perf_counter() - start)
+        assert results, query
+    median = statistics.median(latencies)
+    print(f"\n{CORPUS} листів збережено за {load:.1f} с; пошук: медіана {median * 1000:.1f} мс, "
+          f"найдовший {max(latencies) * 1000:.1f} мс")
+    assert median < 0.1
+
+
+def test_search_works_without_gmail(db, monkeypatch):
+    db.save_emails(list(make_corpus(20)))
+
+    async def offline(chat_id):
+        raise ConnectionError("немає мережі")
+
+    # Ні створення клієнта, ні оновлення токена: пошук не звертається до Gmail
+    monkeypatch.setattr(interface, 'get_gmail', offline)
+    monkeypatch.setattr(services.gmail_pool, 'get', offline)
+    replies = []
+
+    async def reply_text(text, **kwargs):
+        replies.append((text, kwargs.get('reply_markup')))
+
+    update = SimpleNamespace(effective_chat=SimpleNamespace(id=1), message=SimpleNamespace(reply_text=reply_text))
+    asyncio.run(interface.search(update, SimpleNamespace(args=['звіт'], user_data={})))
+
+    text, markup = replies[0]
+    assert 'Результати пошуку' in text
+    # Кнопки несуть ID листа, а не номер у спільному списку
+    data = [button.callback_data for button in markup.inline_keyboard[0]]
+    assert data[0].startswith('read_1_') and len(data[0].encode()) <= 64
+    assert all(d.split('_', 2)[2] in {mail['id'] for mail in make_corpus(20)} for d in data)
@@ -0,0 +1,73 @@
+import os
+import re
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Імпорт main, старт Application (без звернення до Telegram) і одне оновлення через вебхук
+FIRST_UPDATE = '''
+import asyncio
+import main
+from telegram import User
+from telegram.ext import ExtBot
+from web import WebApp
+
+
+async def get_me(self, *args, **kwargs):
+    self._bot_user = User(1, 'TestBot', True, username='test_bot')
+    return self._bot_user
+
+ExtBot.get_me = get_me
+
+
+async def run():
+    application = main.build_application('123:TEST', main.STARTED_AT)
+    await application.initialize()
+    await application.start()
+    body = b'{"update_id": 1, "message": {"message_id": 1, "date": 1700000000, "text": "hi", ' \\
+           b'"chat": {"id": 1, "type": "private"}}}'
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    await WebApp(application, '/telegram')({'type': 'http', 'method': 'POST', 'path': '/telegram', 'headers': []},
+                                           receive, send)
+    await asyncio.sleep(0.2)
+    await application.stop()
+    await application.shutdown()
+
+asyncio.run(run())
+'''
+
+
+def run_python(*args):
+    env = dict(os.environ, TELEGRAM_TOKEN='')
+    return subprocess.run([sys.executable, *args], cwd=PROJECT_DIR, env=env, capture_output=True, text=True,
+                          timeout=60)
+
+
+def test_import_time_is_lazy():
+    result = run_python('-X', 'importtime', '-c', 'import main')
+    assert result.returncode == 0, result.stderr
+    # Рядки: "import time: self [us] | cumulative | imported package"
+    cumulative = {line.rsplit('|', 1)[1].strip(): int(line.split('|')[1])
+                  for line in result.stderr.splitlines() if line.startswith('import time:') and '|' in line
+                  and line.split('|')[1].strip().isdigit()}
+    print(f"\npython -X importtime: import main — {cumulative['main'] / 1000:.0f} мс")
+    # Бібліотеки Google завантажуються лише при першому зверненні до Gmail
+    assert not any(name.startswith('googleapiclient') for name in cumulative)
+
+
+def test_time_to_first_update():
+    result = run_python('-c', FIRST_UPDATE)
+    assert result.returncode == 0, result.stderr
+    match = re.search(r'Перше оновлення через ([\d.]+) с', result.stdout)
+    assert match, result.stdout
+    seconds = float(match.group(1))
+    print(f"\nВід старту процесу до першого оновлення: {seconds:.2f} с")
+    assert seconds < 5
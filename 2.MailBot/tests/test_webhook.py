@@ -0,0 +1,99 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+import uvicorn
+from telegram import Update, User
+from telegram.ext import Application, ExtBot, TypeHandler
+
+from web import WebApp
+
+UPDATES = 2000
+CLIENTS = 32
+SECRET = 'test-secret'
+
+
+def synthetic_update(update_id):
+    return {
+        'update_id': update_id,
+        'message': {'message_id': update_id, 'date': 1700000000, 'text': f'повідомлення {update_id}',
+                    'chat': {'id': update_id % 50 + 1, 'type': 'private'},
+                    'from': {'id': update_id % 50 + 1, 'is_bot': False, 'first_name': 'Тест'}},
+    }
+
+
+async def call_asgi(app, method, path, body=b'', headers=()):
+    """Один запит до ASGI-застосунку без сервера; повертає статус відповіді."""
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app({'type': 'http', 'method': method, 'path': path, 'headers': list(headers)}, receive, send)
+    return sent[0]['status']
+
+
+@pytest.mark.parametrize('body', [b'not json', b'[1, 2]', b'"text"', b'{}'])
+def test_webhook_rejects_non_update_bodies(body):
+    queue = asyncio.Queue()
+    app = WebApp(type('App', (), {'bot': None, 'update_queue': queue})(), '/telegram')
+    assert asyncio.run(call_asgi(app, 'POST', '/telegram', body)) == 400
+    assert queue.empty()
+
+
+def test_webhook_throughput(monkeypatch):
+    async def get_me(self, *args, **kwargs):
+        self._bot_user = User(1, 'TestBot', True, username='test_bot')
+        return self._bot_user
+
+    # Без звернення до api.telegram.org під час initialize()
+    monkeypatch.setattr(ExtBot, 'get_me', get_me)
+
+    async def main():
+        application = Application.builder().token('123:TEST').updater(None).concurrent_updates(64).build()
+        handled = []
+        done = asyncio.Event()
+
+        async def count(update, context):
+            handled.append(update.update_id)
+            if len(handled) == UPDATES:
+                done.set()
+
+        application.add_handler(TypeHandler(Update, count))
+        server = uvicorn.Server(uvicorn.Config(WebApp(application, '/telegram', SECRET), host='127.0.0.1',
+                                               port=0, lifespan='off', log_level='warning'))
+        await application.initialize()
+        await application.start()
+        serve = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        port = server.servers[0].sockets[0].getsockname()[1]
+
+        async def client(ids):
+            async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}') as http:
+                for update_id in ids:
+                    response = await http.post('/telegram', content=json.dumps(synthetic_update(update_id)),
+                                               headers={'X-Telegram-Bot-Api-Secret-Token': SECRET})
+                    assert response.status_code == 200
+
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(*(client(range(i, UPDATES, CLIENTS)) for i in range(CLIENTS)))
+            await asyncio.wait_for(done.wait(), 30)
+            elapsed = time.perf_counter() - start
+        finally:
+            server.should_exit = True
+            await serve
+            await application.stop()
+            await application.shutdown()
+        return elapsed, handled
+
+    elapsed, handled = asyncio.run(main())
+    print(f"\n{UPDATES} оновлень через вебхук за {elapsed:.2f} с: {UPDATES / elapsed:.0f} оновлень/с")
+    assert sorted(handled) == list(range(UPDATES))
+    assert UPDATES / elapsed > 100
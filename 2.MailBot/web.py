@@ -0,0 +1,89 @@
+import json
+
+from telegram import Update
+
+import metrics
+
+# Telegram передає секрет у цьому заголовку кожного запиту вебхука
+SECRET_HEADER = b'x-telegram-bot-api-secret-token'
+
+
+class WebApp:
+    """
+    Мінімальний ASGI-застосунок: health-check для Render, endpoint вебхука Telegram,
+    метрики Prometheus (/metrics) і стеки профайлера (/debug/profile).
+    Оновлення одразу потрапляють у чергу Application в тому ж event loop.
+    """
+
+    def __init__(self, application, webhook_path='/telegram', secret_token=None):
+        self.application = application
+        self.secret_token = secret_token
+        self.routes = {
+            ('GET', '/'): self.home,
+            ('HEAD', '/'): self.home,
+            ('POST', webhook_path): self.telegram_webhook,
+            ('GET', '/metrics'): self.metrics_page,
+        }
+        # Профайлер вмикається лише змінною PROFILE_HANDLERS, тож і сторінка з'являється тільки тоді
+        if metrics.PROFILED_HANDLERS:
+            self.routes[('GET', '/debug/profile')] = self.profile_page
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return
+
+        handler = self.routes.get((scope['method'], scope['path']))
+        if handler is None:
+            if any(path == scope['path'] for _, path in self.routes):
+                await respond(send, 405, "Method Not Allowed")
+            else:
+                await respond(send, 404, "Not Found")
+            return
+        await handler(scope, receive, send)
+
+    async def home(self, scope, receive, send):
+        await respond(send, 200, "Bot is alive! (Ця сторінка потрібна, щоб Render не вимикав сервіс)")
+
+    async def metrics_page(self, scope, receive, send):
+        await respond(send, 200, metrics.render_prometheus(), 'text/plain; version=0.0.4; charset=utf-8')
+
+    async def profile_page(self, scope, receive, send):
+        await respond(send, 200, metrics.profiler.render())
+
+    async def telegram_webhook(self, scope, receive, send):
+        headers = dict(scope['headers'])
+        if self.secret_token and headers.get(SECRET_HEADER, b'').decode() != self.secret_token:
+            await respond(send, 403, "Forbidden")
+            return
+
+        try:
+            data = json.loads(await read_body(receive))
+            # JSON-масив, рядок чи об'єкт без update_id — не оновлення Telegram
+            if not isinstance(data, dict):
+                raise ValueError("тіло запиту не є об'єктом")
+            update = Update.de_json(data, self.application.bot)
+        except (ValueError, TypeError, KeyError, AttributeError):
+            await respond(send, 400, "Bad Request")
+            return
+
+        await self.application.update_queue.put(update)
+        await respond(send, 200, "OK")
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def respond(send, status, text, content_type='text/plain; charset=utf-8'):
+    body = text.encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type.encode()), (b'content-length', str(len(body)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': body})
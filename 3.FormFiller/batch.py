@@ -0,0 +1,196 @@
+import csv
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from checkpoint import DONE, UNCERTAIN
+from pacing import format_timings
+
+# За замовчуванням — по одному браузеру на ядро
+DEFAULT_WORKERS = os.cpu_count() or 2
+# Скільки разів повторювати відправку рядка після помилки
+RETRIES = 2
+REPORT_FIELDS = ['row', 'status', 'attempts', 'seconds', 'timings', 'missing', 'error']
+# Скільки рядків на один потік може чекати в черзі (пам'ять не залежить від розміру CSV)
+QUEUE_PER_WORKER = 2
+
+
+class SubmitUncertain(Exception):
+    """
+    Помилка після того, як відповідь уже могла дійти до форми (натиснуто "Надіслати", POST відправлено).
+    Такий рядок не повторюється, щоб не створити дублікат відповіді.
+    """
+
+
+def read_submissions(path):
+    """
+    Потоково читає CSV пакетного режиму: перший рядок — тексти питань,
+    кожен наступний — відповіді однієї відправки. Видає пари (номер рядка, словник відповідей).
+    """
+    with open(path, mode='r', encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        for row_number, row in enumerate(reader, start=1):
+            yield row_number, {q.strip(): (a or '').strip() for q, a in row.items() if q and q.strip()}
+
+
+class BatchRunner:
+    """
+    Розподіляє відправки між пулом потоків. Кожен потік має власний filler
+    (створюється filler_factory при першому завданні і використовується повторно).
+    """
+
+    def __init__(self, filler_factory, workers=DEFAULT_WORKERS, retries=RETRIES, checkpoint=None,
+                 resubmit_uncertain=False):
+        self.filler_factory = filler_factory
+        self.workers = workers
+        self.retries = retries
+        # Журнал відправлених рядків (Checkpoint) для продовження після збою
+        self.checkpoint = checkpoint
+        # Чи відправляти заново рядки, відправка яких почалася, але не підтвердилася
+        self.resubmit_uncertain = resubmit_uncertain
+        self._local = threading.local()
+        self._fillers = []
+        self._lock = threading.Lock()
+
+    def _filler(self):
+        filler = getattr(self._local, 'filler', None)
+        if filler is None:
+            filler = self.filler_factory()
+            with self._lock:
+                self._fillers.append(filler)
+            self._local.filler = filler
+        return filler
+
+    def _discard_filler(self):
+        """Після помилки браузер може бути в невідомому стані, тому наступна спроба починає з нового."""
+        filler = getattr(self._local, 'filler', None)
+        if filler is None:
+            return
+        self._local.filler = None
+        with self._lock:
+            self._fillers.remove(filler)
+        try:
+            filler.close()
+        except Exception as e:
+            print(f"Помилка закриття браузера: {e}")
+
+    def submit_row(self, row_number, answers):
+        """
+        Відправляє один рядок і повертає рядок звіту. Повторюються лише помилки до відправки;
+        якщо відповідь могла дійти до форми (SubmitUncertain), рядок позначається 'uncertain'.
+        """
+        start = time.perf_counter()
+        error = ''
+        if self.checkpoint is not None:
+            # Запис до відправки: якщо процес обірветься, продовження знатиме про цей рядок
+            try:
+                self.checkpoint.mark_started(row_number)
+            except Exception as e:
+                # Без запису в журналі рядок не відправляється
+                return {'row': row_number, 'status': 'failed', 'attempts': 0,
+                        'seconds': round(time.perf_counter() - start, 3), 'timings': '', 'missing': '',
+                        'error': f"журнал: {_first_line(e)}"}
+        for attempt in range(1, self.retries + 2):
+            try:
+                filler = self._filler()
+                missing = filler.submit(answers)
+            except SubmitUncertain as e:
+                error = _first_line(e)
+                print(f"Рядок {row_number}, спроба {attempt}: {error} (не повторюється, перевірте відповіді форми)")
+                self._discard_filler()
+                if self.checkpoint is not None:
+                    self.checkpoint.mark_uncertain(row_number)
+                return {'row': row_number, 'status': 'uncertain', 'attempts': attempt,
+                        'seconds': round(time.perf_counter() - start, 3), 'timings': '', 'missing': '',
+                        'error': error}
+            except Exception as e:
+                error = _first_line(e)
+                print(f"Рядок {row_number}, спроба {attempt}: {error}")
+                self._discard_filler()
+                continue
+
+            # Відправку підтверджено — помилка журналу вже не привід повторювати рядок
+            result = {'row': row_number, 'status': 'ok', 'attempts': attempt,
+                      'seconds': round(time.perf_counter() - start, 3),
+                      'timings': format_timings(filler.last_timings),
+                      'missing': '; '.join(missing), 'error': ''}
+            if self.checkpoint is not None:
+                try:
+                    self.checkpoint.mark_done(row_number)
+                except Exception as e:
+                    # Рядок лишається 'started', тож і продовження не відправить його вдруге
+                    error = _first_line(e)
+                    print(f"Рядок {row_number}: відправлено, але журнал не оновлено: {error}")
+                    result.update(status='uncertain', error=f"відправлено, журнал не оновлено: {error}")
+            return result
+
+        if self.checkpoint is not None:
+            # Жодна спроба не дійшла до відправки — наступний запуск спробує рядок знову
+            self.checkpoint.forget(row_number)
+        return {'row': row_number, 'status': 'failed', 'attempts': self.retries + 1,
+                'seconds': round(time.perf_counter() - start, 3), 'timings': '', 'missing': '', 'error': error}
+
+    def run(self, submissions, report_path):
+        """
+        Відправляє рядки з ітератора submissions, дописуючи результат кожного у report_path.
+        Підтверджені в журналі рядки пропускаються. Рядки, відправка яких обірвалася (або вже
+        позначена невизначеною), без resubmit_uncertain не відправляються: перервані записуються
+        у звіт як 'uncertain', а вже звітовані пропускаються.
+        Повертає (успішні, невдалі, невизначені, пропущені).
+        """
+        counts = {'ok': 0, 'failed': 0, 'uncertain': 0}
+        skipped = 0
+        # При продовженні звіт доповнюється, а не перезаписується
+        new_report = not os.path.exists(report_path) or os.path.getsize(report_path) == 0
+        try:
+            with open(report_path, mode='a', encoding='utf-8', newline='') as f, \
+                    ThreadPoolExecutor(max_workers=self.workers) as pool:
+                writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+                if new_report:
+                    writer.writeheader()
+
+                def collect(done):
+                    for future in done:
+                        result = future.result()
+                        writer.writerow(result)
+                        counts[result['status']] += 1
+                    f.flush()
+
+                # Нові рядки читаються лише тоді, коли звільняється місце в черзі
+                pending = set()
+                for row_number, answers in submissions:
+                    status = self.checkpoint.status(row_number) if self.checkpoint is not None else None
+                    if status == DONE or (status == UNCERTAIN and not self.resubmit_uncertain):
+                        skipped += 1
+                        continue
+                    if status is not None and not self.resubmit_uncertain:
+                        # Процес обірвався посеред відправки: відповідь могла дійти до форми
+                        self.checkpoint.mark_uncertain(row_number)
+                        writer.writerow({'row': row_number, 'status': 'uncertain', 'attempts': 0, 'seconds': 0,
+                                         'timings': '', 'missing': '',
+                                         'error': "відправку перервано; повтор — з --resubmit-uncertain"})
+                        counts['uncertain'] += 1
+                        continue
+                    if len(pending) >= self.workers * QUEUE_PER_WORKER:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    pending.add(pool.submit(self.submit_row, row_number, answers))
+
+                collect(wait(pending).done)
+        finally:
+            self.close()
+        return counts['ok'], counts['failed'], counts['uncertain'], skipped
+
+    def close(self):
+        with self._lock:
+            fillers, self._fillers = self._fillers, []
+        for filler in fillers:
+            try:
+                filler.close()
+            except Exception as e:
+                print(f"Помилка закриття браузера: {e}")
+
+
+def _first_line(error):
+    return (str(error).strip().splitlines() or [type(error).__name__])[0]
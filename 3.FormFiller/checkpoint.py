@@ -0,0 +1,82 @@
+import sqlite3
+import threading
+from datetime import datetime
+
+# Стан рядка в журналі: відправка почалася / підтверджена / могла дійти, але підтвердження немає
+STARTED = 'started'
+DONE = 'done'
+UNCERTAIN = 'uncertain'
+
+
+class Checkpoint:
+    """
+    Журнал відправок у SQLite. Перед відправкою рядок записується як 'started', після
+    підтвердження — як 'done' (кожен запис з commit). Якщо процес обірвався посеред відправки,
+    рядок лишається 'started': при продовженні він не відправляється наосліп, а потрапляє у звіт
+    як невизначений (або відправляється повторно, якщо так налаштовано).
+    """
+
+    def __init__(self, path, form_url):
+        self.form_url = form_url
+        self._lock = threading.Lock()
+        # Записують потоки пулу, читає головний потік — доступ серіалізується блокуванням
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS submitted (
+                form_url TEXT NOT NULL,
+                row INTEGER NOT NULL,
+                finished_at TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'done',
+                PRIMARY KEY (form_url, row)
+            )
+        ''')
+        columns = [r[1] for r in self._conn.execute("PRAGMA table_info(submitted)")]
+        if 'status' not in columns:
+            # Журнал старої версії містив лише підтверджені відправки
+            self._conn.execute("ALTER TABLE submitted ADD COLUMN status TEXT NOT NULL DEFAULT 'done'")
+        self._conn.commit()
+
+    def status(self, row_number):
+        """Стан рядка в журналі (STARTED, DONE, UNCERTAIN) або None, якщо його ще не відправляли."""
+        with self._lock:
+            found = self._conn.execute('SELECT status FROM submitted WHERE form_url = ? AND row = ?',
+                                       (self.form_url, row_number)).fetchone()
+        return found[0] if found else None
+
+    def _set(self, row_number, status):
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO submitted (form_url, row, finished_at, status) '
+                               'VALUES (?, ?, ?, ?)',
+                               (self.form_url, row_number, datetime.now().isoformat(timespec='seconds'), status))
+            self._conn.commit()
+
+    def mark_started(self, row_number):
+        self._set(row_number, STARTED)
+
+    def mark_done(self, row_number):
+        self._set(row_number, DONE)
+
+    def mark_uncertain(self, row_number):
+        self._set(row_number, UNCERTAIN)
+
+    def forget(self, row_number):
+        """Відправка не відбулася (помилка до надсилання) — рядок можна відправити наступного запуску."""
+        with self._lock:
+            self._conn.execute('DELETE FROM submitted WHERE form_url = ? AND row = ?', (self.form_url, row_number))
+            self._conn.commit()
+
+    def count(self, status=DONE):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM submitted WHERE form_url = ? AND status = ?',
+                                      (self.form_url, status)).fetchone()[0]
+
+    def reset(self):
+        """Забуває всі відправки цієї форми (запуск з нуля)."""
+        with self._lock:
+            self._conn.execute('DELETE FROM submitted WHERE form_url = ?', (self.form_url,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
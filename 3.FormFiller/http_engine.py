@@ -0,0 +1,202 @@
+import json
+import re
+import threading
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from batch import SubmitUncertain
+
+from matching import normalize, find_field
+from pacing import step
+
+# Google Forms вбудовує опис форми в сторінку як JS-масив
+LOAD_DATA_RE = re.compile(r'FB_PUBLIC_LOAD_DATA_\s*=\s*(.*?);\s*</script>', re.DOTALL)
+ACTION_RE = re.compile(r'<form[^>]*\saction="([^"]+)"', re.IGNORECASE)
+FBZX_RE = re.compile(r'name="fbzx"\s+value="([^"]*)"')
+
+# Типи питань Google Forms, які можна заповнити одним полем entry.<id>
+FIELD_TYPES = {0: 'text', 1: 'text', 2: 'radio', 3: 'radio', 4: 'checkbox', 5: 'radio'}
+# Елементи, що не є питаннями: текст, розділ, зображення, відео
+SECTION_TYPE = 8
+NON_QUESTION_TYPES = {6, SECTION_TYPE, 11, 12}
+
+REQUEST_TIMEOUT = 15
+
+_schema_lock = threading.Lock()
+_schemas = {}
+
+
+class UnsupportedForm(Exception):
+    """Форму (або потрібне поле) не можна відправити без браузера."""
+
+
+def make_session(pool_size):
+    """HTTP-сесія з пулом з'єднань, спільна для всіх потоків."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def response_url(form_url):
+    """Адреса відправки: .../viewform -> .../formResponse (без параметрів запиту)."""
+    parts = urlsplit(form_url)
+    path = parts.path.rsplit('/', 1)[0] + '/formResponse'
+    return urlunsplit((parts.scheme, parts.netloc, path, '', ''))
+
+
+def parse_form(html, form_url):
+    """
+    Розбирає сторінку форми в схему:
+    {'action', 'fbzx', 'pages', 'fields': {нормалізований заголовок: {'name', 'type', 'options'}}}.
+    """
+    match = LOAD_DATA_RE.search(html)
+    if not match:
+        raise UnsupportedForm("На сторінці немає FB_PUBLIC_LOAD_DATA_ (потрібен вхід або це не Google Форма)")
+    try:
+        data = json.loads(match.group(1))
+        items = data[1][1] or []
+    except (ValueError, IndexError, TypeError) as e:
+        raise UnsupportedForm(f"Невідомий формат даних форми: {e}")
+
+    fields = {}
+    pages = 1
+    for item in items:
+        item_type = item[3]
+        if item_type == SECTION_TYPE:
+            pages += 1
+        if item_type in NON_QUESTION_TYPES or not item[1]:
+            continue
+
+        entries = item[4] or []
+        field_type = FIELD_TYPES.get(item_type)
+        # Сітки, дата, час, файли мають кілька полів або потребують браузера
+        if field_type is None or len(entries) != 1:
+            fields[normalize(item[1])] = {'name': None, 'type': None, 'options': []}
+            continue
+
+        entry = entries[0]
+        options = [option[0] for option in (entry[1] or []) if option and option[0]]
+        fields[normalize(item[1])] = {'name': f"entry.{entry[0]}", 'type': field_type, 'options': options}
+
+    action = ACTION_RE.search(html)
+    fbzx = FBZX_RE.search(html)
+    return {
+        'action': urljoin(form_url, action.group(1)) if action else response_url(form_url),
+        'fbzx': fbzx.group(1) if fbzx else '',
+        'pages': pages,
+        'fields': fields,
+    }
+
+
+def get_form_schema(session, form_url):
+    """Схема форми; сторінка завантажується й розбирається один раз для кожного URL."""
+    with _schema_lock:
+        schema = _schemas.get(form_url)
+    if schema is not None:
+        return schema
+
+    if urlsplit(form_url).scheme not in ('http', 'https'):
+        raise UnsupportedForm(f"HTTP-рушій не підтримує адресу {form_url}")
+    response = session.get(form_url, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    schema = parse_form(response.text, response.url)
+
+    with _schema_lock:
+        _schemas[form_url] = schema
+    return schema
+
+
+def _not_sent(error):
+    """З'єднання не встановлено — сервер точно не отримав запиту, і його можна повторити."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class HttpFormFiller:
+    """Відправляє відповіді POST-запитом на formResponse без браузера."""
+
+    def __init__(self, form_url, session):
+        self.form_url = form_url
+        self.session = session
+        # Тривалість кроків останньої відправки: schema, post (секунди)
+        self.last_timings = {}
+
+    def submit(self, answers_dict):
+        """Той самий контракт, що й GoogleFormFiller.submit: повертає список незнайдених питань."""
+        self.last_timings = timings = {}
+        with step(timings, 'schema'):
+            schema = get_form_schema(self.session, self.form_url)
+        data = {
+            'fvv': '1',
+            'fbzx': schema['fbzx'],
+            'pageHistory': ','.join(str(page) for page in range(schema['pages'])),
+        }
+        missing = []
+
+        for question, answer in answers_dict.items():
+            if not answer:
+                continue
+            field = find_field(schema['fields'], question)
+            if field is None:
+                missing.append(question)
+                continue
+            if field['name'] is None:
+                raise UnsupportedForm(f"Поле '{question}' не підтримується HTTP-рушієм")
+            if field['options']:
+                # Як і в браузері, варіант шукається без урахування регістру й пробілів,
+                # але відправляється точно в тому вигляді, як його записано у формі
+                option = next((o for o in field['options'] if normalize(o) == normalize(answer)), None)
+                if option is None:
+                    missing.append(question)
+                    continue
+                answer = option
+            data[field['name']] = answer
+
+        with step(timings, 'post'):
+            try:
+                response = self.session.post(schema['action'], data=data, timeout=REQUEST_TIMEOUT)
+            except requests.RequestException as e:
+                if _not_sent(e):
+                    raise
+                # Запит міг дійти до Google, а обірвалася лише відповідь
+                raise SubmitUncertain(f"Немає відповіді на відправку форми: {e}") from e
+            response.raise_for_status()
+        return missing
+
+    def close(self):
+        # Сесія спільна для всіх потоків і закривається в головному блоці
+        pass
+
+
+class FallbackFiller:
+    """Пробує HTTP-рушій, а якщо форма йому не підходить — переходить на браузер (створюється лише тоді)."""
+
+    def __init__(self, primary, fallback_factory):
+        self.primary = primary
+        self.fallback_factory = fallback_factory
+        self.fallback = None
+
+    def submit(self, answers_dict):
+        if self.fallback is None:
+            try:
+                return self.primary.submit(answers_dict)
+            except UnsupportedForm as e:
+                print(f"HTTP-рушій недоступний ({e}), використовується браузер.")
+                self.fallback = self.fallback_factory()
+        return self.fallback.submit(answers_dict)
+
+    @property
+    def last_timings(self):
+        return (self.fallback or self.primary).last_timings
+
+    def close(self):
+        self.primary.close()
+        if self.fallback is not None:
+            self.fallback.close()
@@ -1,111 +1,172 @@
+import argparse
 import csv
+import os
+import threading
 import time
+from pathlib import Path
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
+from batch import BatchRunner, SubmitUncertain, read_submissions, DEFAULT_WORKERS, RETRIES
+from checkpoint import Checkpoint, STARTED, UNCERTAIN
+from http_engine import HttpFormFiller, FallbackFiller, make_session
+from matching import normalize, find_field
+from pacing import pause, step, format_timings, PROFILES, DEFAULT_PROFILE
 
 # Замініть на ваше посилання на Google Форму
 FORM_URL = "https://docs.google.com/forms/d/e/1FAIpQLSei5b0q6xOYRMJpM_QkIZ2p1B8vaqWf-RHA1aEocZrEjn4wMQ/viewform?usp=dialog"
 CSV_FILE = "answers.csv"
+REPORT_FILE = "report.csv"
+# auto: HTTP-відправка, а для непідтримуваних форм — браузер
+ENGINES = ('auto', 'http', 'selenium')
+
+# Збирає всі блоки питань форми за один виклик: [заголовок, текстове поле, [[варіант, елемент], ...]]
+INDEX_SCRIPT = """
+return Array.from(document.querySelectorAll('div[role="listitem"]')).map(function (item) {
+    var heading = item.querySelector('[role="heading"]');
+    var inputs = Array.from(item.querySelectorAll('input:not([type="hidden"]), textarea')).filter(function (el) {
+        return el.offsetParent !== null;
+    });
+    var options = Array.from(item.querySelectorAll('[role="radio"], [role="checkbox"]')).map(function (el) {
+        return [el.getAttribute('aria-label') || el.getAttribute('data-value') || el.textContent, el];
+    });
+    return [heading ? heading.textContent : '', inputs[0] || null, options];
+});
+"""
+
+_driver_lock = threading.Lock()
+_driver_path = None
+
+
+def chromedriver_path():
+    """Шлях до chromedriver; webdriver_manager викликається один раз на процес, а не для кожного браузера."""
+    global _driver_path
+    with _driver_lock:
+        if _driver_path is None:
+            _driver_path = ChromeDriverManager().install()
+        return _driver_path
+
+
+def form_url_from_arg(value):
+    """Дозволяє передати замість посилання шлях до локального HTML-файлу форми."""
+    if os.path.exists(value):
+        return Path(value).resolve().as_uri()
+    return value
 
 
 class GoogleFormFiller:
-    def __init__(self, form_url):
+    def __init__(self, form_url, headless=False, pacing=DEFAULT_PROFILE):
         self.form_url = form_url
-        service = Service(ChromeDriverManager().install())
-        self.driver = webdriver.Chrome(service=service)
+        self.pacing = pacing
+        # Тривалість кроків останньої відправки: load, fill, submit (секунди)
+        self.last_timings = {}
+        options = webdriver.ChromeOptions()
+        if headless:
+            options.add_argument("--headless=new")
+            options.add_argument("--window-size=1280,2000")
+        service = Service(chromedriver_path())
+        self.driver = webdriver.Chrome(service=service, options=options)
         self.wait = WebDriverWait(self.driver, 10)
 
-    def fill_form(self, answers_dict):
-        try:
+    def submit(self, answers_dict):
+        """
+        Заповнює і відправляє форму. Повертає список питань, для яких поле не знайдено.
+        Помилки не перехоплюються: повторні спроби робить BatchRunner.
+        """
+        self.last_timings = timings = {}
+        with step(timings, 'load'):
             self.driver.get(self.form_url)
-            print(f"Початок заповнення. Кількість відповідей: {len(answers_dict)}")
-
-            for question, answer in answers_dict.items():
-                if not answer:
-                    continue
+            # Форма готова, щойно з'явився перший блок питання
+            self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'div[role="listitem"]')))
+            index = self._build_index()
 
-                print(f"Обробка питання: '{question}'")
+        missing = []
+        for question, answer in answers_dict.items():
+            if not answer:
+                continue
 
-                # Спроба заповнити текстове поле
-                if self._try_fill_text(question, answer):
-                    continue
+            field = find_field(index, question)
+            pause(self.pacing)
+            with step(timings, 'fill'):
+                if field is None or not self._fill_field(field, answer):
+                    missing.append(question)
 
-                # Спроба обрати радіо-кнопку або чекбокс
-                if self._try_select_radio(question, answer):
-                    continue
-
-                print(f"Поле не знайдено для питання: {question}")
-
-            # Відправка форми
+        # Відправка форми
+        pause(self.pacing)
+        with step(timings, 'submit'):
             self._submit_form()
+        return missing
 
-        except Exception as e:
-            print(f"Помилка виконання: {e}")
+    def _build_index(self):
+        """
+        Один прохід по формі (один виклик execute_script): для кожного блоку питання (listitem)
+        повертає заголовок, видиме текстове поле та варіанти відповіді.
+        Індекс: {нормалізований заголовок: {'input': елемент або None, 'options': {текст варіанта: елемент}}}.
+        """
+        items = self.driver.execute_script(INDEX_SCRIPT)
+        index = {}
+        for heading, text_input, options in items:
+            index.setdefault(normalize(heading), {
+                'input': text_input,
+                'options': {normalize(label): element for label, element in options if label},
+            })
+        return index
 
-    def _try_fill_text(self, question_text, answer_text):
-        """Шукає input або textarea, пов'язані з текстом питання."""
-        try:
-            # Змінено стратегію: шукаємо блок питання (listitem), який має заголовок (heading) з нашим текстом
-            # Це працює краще для кирилиці, ніж пошук в data-params
-            container_xpath = f"//div[@role='listitem'][.//div[@role='heading'][contains(., '{question_text}')]]"
-
-            xpath = f"{container_xpath}//input | {container_xpath}//textarea"
-            elements = self.driver.find_elements(By.XPATH, xpath)
-            if elements and elements[0].is_displayed():
-                elements[0].clear()
-                elements[0].send_keys(answer_text)
-                return True
-            return False
-        except:
-            return False
-
-    def _try_select_radio(self, question_text, option_text):
-        """Шукає варіант відповіді (radio/checkbox) за текстом."""
-        try:
-            # Змінено стратегію: шукаємо контейнер за видимим заголовком
-            container_xpath = f"//div[@role='listitem'][.//div[@role='heading'][contains(., '{question_text}')]]"
-
-            # Шукаємо option за aria-label або текстом всередині span у знайденому контейнері
-            option_xpath = f"{container_xpath}//div[@role='radio' and @aria-label='{option_text}'] | {container_xpath}//span[text()='{option_text}']"
-
-            elements = self.driver.find_elements(By.XPATH, option_xpath)
-            if elements:
-                self.driver.execute_script("arguments[0].scrollIntoView(true);", elements[0])
-                time.sleep(0.5)
-                elements[0].click()
-                return True
-            return False
-        except:
-            return False
+    def _fill_field(self, field, answer):
+        """Обирає варіант відповіді (radio/checkbox) або вводить текст у поле питання."""
+        option = field['options'].get(normalize(answer))
+        if option is not None:
+            self.driver.execute_script("arguments[0].scrollIntoView(true);", option)
+            self.wait.until(EC.element_to_be_clickable(option)).click()
+            return True
+
+        if field['input'] is not None:
+            self.wait.until(EC.element_to_be_clickable(field['input']))
+            field['input'].clear()
+            field['input'].send_keys(answer)
+            return True
+        return False
 
     def _submit_form(self):
-        """Шукає кнопку відправки та натискає її."""
+        """Шукає кнопку відправки, натискає її і чекає на сторінку підтвердження."""
+        submit_btn = self.wait.until(EC.element_to_be_clickable(
+            (By.XPATH,
+             "//span[text()='Надіслати' or text()='Submit' or text()='Отправить']/ancestor::div[@role='button']")
+        ))
+        submit_btn.click()
+        # Google переходить на .../formResponse; для інших сторінок достатньо того, що форма зникла
         try:
-            submit_btn = self.wait.until(EC.element_to_be_clickable(
-                (By.XPATH,
-                 "//span[text()='Надіслати' or text()='Submit' or text()='Отправить']/ancestor::div[@role='button']")
-            ))
-            submit_btn.click()
-            print("Форма відправлена успішно.")
-            time.sleep(2)
+            self.wait.until(EC.any_of(EC.url_contains('formResponse'), EC.staleness_of(submit_btn)))
         except Exception as e:
-            print(f"Помилка відправки: {e}")
+            # Кнопку вже натиснуто: відповідь могла зберегтися, навіть якщо підтвердження не дочекалися
+            raise SubmitUncertain(f"Немає підтвердження відправки: {type(e).__name__}") from e
 
     def close(self):
         self.driver.quit()
 
 
-# --- ГОЛОВНИЙ БЛОК ---
-if __name__ == "__main__":
+def filler_factory(engine, form_url, session, headless, pacing=DEFAULT_PROFILE):
+    """Повертає функцію, що створює filler обраного рушія."""
+    def browser():
+        return GoogleFormFiller(form_url, headless=headless, pacing=pacing)
+
+    if engine == 'selenium':
+        return browser
+    if engine == 'http':
+        return lambda: HttpFormFiller(form_url, session)
+    return lambda: FallbackFiller(HttpFormFiller(form_url, session), browser)
+
+
+def run_single(form_url, csv_file, engine, pacing):
+    """Одна відправка: CSV з парами "Питання,Відповідь"."""
     single_submission_data = {}
 
     # Зчитування відповідей з CSV
     try:
-        with open(CSV_FILE, mode='r', encoding='utf-8') as f:
+        with open(csv_file, mode='r', encoding='utf-8') as f:
             reader = csv.reader(f)
             next(reader, None)  # Пропускаємо рядок заголовків
 
@@ -116,13 +177,91 @@ if __name__ == "__main__":
                     if q_text:
                         single_submission_data[q_text] = a_text
     except FileNotFoundError:
-        print(f"Файл {CSV_FILE} не знайдено.")
-        exit()
+        print(f"Файл {csv_file} не знайдено.")
+        return
 
     print(f"Завантажено записів: {len(single_submission_data)}")
 
     # Запуск автоматизації
-    filler = GoogleFormFiller(FORM_URL)
-    filler.fill_form(single_submission_data)
-    time.sleep(2)
-    filler.close()
\ No newline at end of file
+    session = make_session(1)
+    filler = filler_factory(engine, form_url, session, headless=False, pacing=pacing)()
+    try:
+        missing = filler.submit(single_submission_data)
+        for question in missing:
+            print(f"Поле не знайдено для питання: {question}")
+        print(f"Форма відправлена успішно. {format_timings(filler.last_timings)}")
+    except Exception as e:
+        print(f"Помилка виконання: {e}")
+    finally:
+        filler.close()
+        session.close()
+
+
+def run_batch(form_url, csv_file, engine, pacing, workers, retries, report_file, checkpoint_file, restart,
+              resubmit_uncertain=False):
+    """
+    Пакетний режим: CSV, де заголовок — питання, а кожен рядок — окрема відправка.
+    Файл читається потоково, а відправлені рядки записуються в журнал, тож перерваний запуск продовжується.
+    """
+    if not os.path.exists(csv_file):
+        print(f"Файл {csv_file} не знайдено.")
+        return
+
+    checkpoint = Checkpoint(checkpoint_file or csv_file + '.checkpoint.db', form_url)
+    if restart:
+        checkpoint.reset()
+        # Звіт описує лише поточний запуск, а не дописується до попереднього
+        open(report_file, 'w').close()
+    done = checkpoint.count()
+    if done:
+        print(f"Продовження: {done} рядків уже відправлено, вони будуть пропущені.")
+    interrupted = checkpoint.count(STARTED) + checkpoint.count(UNCERTAIN)
+    if interrupted:
+        action = "будуть відправлені повторно" if resubmit_uncertain else "не повторюються (див. звіт)"
+        print(f"Відправка {interrupted} рядків не підтверджена, вони {action}.")
+
+    print(f"Потоків: {workers}, рушій: {engine}")
+    if engine == 'selenium':
+        # Драйвер завантажуємо до старту потоків, щоб вони не робили цього одночасно
+        chromedriver_path()
+
+    session = make_session(workers)
+    runner = BatchRunner(filler_factory(engine, form_url, session, headless=True, pacing=pacing),
+                         workers, retries, checkpoint, resubmit_uncertain)
+    start = time.perf_counter()
+    try:
+        ok, failed, uncertain, skipped = runner.run(read_submissions(csv_file), report_file)
+    finally:
+        session.close()
+        checkpoint.close()
+    print(f"Готово за {time.perf_counter() - start:.1f} с: успішно {ok}, з помилками {failed}, "
+          f"невідомо (не повторювались) {uncertain}, пропущено {skipped}. Звіт: {report_file}")
+
+
+# --- ГОЛОВНИЙ БЛОК ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Автоматичне заповнення Google Форми з CSV")
+    parser.add_argument("--url", default=FORM_URL, help="посилання на форму або шлях до локального HTML-файлу")
+    parser.add_argument("--csv", default=CSV_FILE, help="файл з відповідями")
+    parser.add_argument("--batch", action="store_true",
+                        help="пакетний режим: заголовок CSV — питання, кожен рядок — окрема відправка")
+    parser.add_argument("--engine", choices=ENGINES, default='auto',
+                        help="auto — HTTP-запити з переходом на браузер, якщо форма їх не підтримує")
+    parser.add_argument("--pacing", choices=sorted(PROFILES), default=DEFAULT_PROFILE,
+                        help="паузи між діями в браузері: fast — без пауз, human — випадкові затримки")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="кількість паралельних потоків")
+    parser.add_argument("--retries", type=int, default=RETRIES, help="повторні спроби для кожного рядка")
+    parser.add_argument("--report", default=REPORT_FILE, help="файл звіту пакетного режиму")
+    parser.add_argument("--checkpoint", help="журнал відправлених рядків (за замовчуванням <csv>.checkpoint.db)")
+    parser.add_argument("--restart", action="store_true",
+                        help="ігнорувати журнал і звіт і відправити всі рядки заново")
+    parser.add_argument("--resubmit-uncertain", action="store_true",
+                        help="повторно відправити рядки, відправка яких почалася, але не підтвердилася")
+    args = parser.parse_args()
+
+    url = form_url_from_arg(args.url)
+    if args.batch:
+        run_batch(url, args.csv, args.engine, args.pacing, args.workers, args.retries, args.report,
+                  args.checkpoint, args.restart, args.resubmit_uncertain)
+    else:
+        run_single(url, args.csv, args.engine, args.pacing)
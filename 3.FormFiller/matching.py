@@ -0,0 +1,28 @@
+import difflib
+
+# Мінімальна схожість заголовка для нечіткого пошуку (difflib, від 0 до 1)
+FUZZY_CUTOFF = 0.8
+
+
+def normalize(text):
+    """Регістр, зайві пробіли і зірочка обов'язкового питання не впливають на пошук."""
+    return ' '.join((text or '').split()).rstrip(' *').casefold()
+
+
+def find_field(fields, question):
+    """
+    Шукає поле у словнику {нормалізований заголовок: поле}:
+    точний збіг, потім заголовок, що містить питання (як contains() у XPath),
+    і нарешті найближчий за difflib заголовок (опечатки, інша пунктуація).
+    """
+    key = normalize(question)
+    field = fields.get(key)
+    if field is not None:
+        return field
+
+    for heading, field in fields.items():
+        if key in heading:
+            return field
+
+    close = difflib.get_close_matches(key, fields.keys(), n=1, cutoff=FUZZY_CUTOFF)
+    return fields[close[0]] if close else None
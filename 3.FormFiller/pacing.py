@@ -0,0 +1,31 @@
+import random
+import time
+from contextlib import contextmanager
+
+# Штучні паузи перед кожною дією (секунди, від-до):
+# fast — без пауз, human — випадкові затримки, як у людини
+PROFILES = {
+    'fast': (0.0, 0.0),
+    'human': (0.3, 1.2),
+}
+DEFAULT_PROFILE = 'fast'
+
+
+def pause(profile):
+    low, high = PROFILES[profile]
+    if high > 0:
+        time.sleep(random.uniform(low, high))
+
+
+@contextmanager
+def step(timings, name):
+    """Додає тривалість блоку до timings[name] (кроки, що повторюються, підсумовуються)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = round(timings.get(name, 0.0) + time.perf_counter() - start, 3)
+
+
+def format_timings(timings):
+    return ' '.join(f"{name}={seconds}" for name, seconds in timings.items())
@@ -0,0 +1,46 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import http_engine  # noqa: E402
+from form_fixture import FormServer  # noqa: E402
+
+
+@pytest.fixture
+def form_server(monkeypatch):
+    """Локальний сервер форми з tests/fixtures; схеми форм не переходять між тестами."""
+    monkeypatch.setattr(http_engine, '_schemas', {})
+    server = FormServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture(scope='session')
+def form_main():
+    """
+    main.py проєкту під окремим ім'ям модуля: у спільному запуску pytest
+    ім'я main може бути зайняте іншим проєктом репозиторію.
+    """
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+    spec = importlib.util.spec_from_file_location('form_filler_main', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='session')
+def browser_factory(form_main):
+    """Фабрика headless GoogleFormFiller; тести з браузером пропускаються, якщо Chrome недоступний."""
+    try:
+        form_main.GoogleFormFiller('about:blank', headless=True).close()
+    except Exception as e:
+        pytest.skip(f"Chrome недоступний: {(str(e).strip().splitlines() or [type(e).__name__])[0]}")
+
+    def factory(form_url):
+        return lambda: form_main.GoogleFormFiller(form_url, headless=True)
+
+    return factory
@@ -0,0 +1,140 @@
+import html
+import json
+import os
+import threading
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+# Типи питань FB_PUBLIC_LOAD_DATA_: 0 — рядок, 1 — абзац, 2 — один варіант
+TEXT, PARAGRAPH, RADIO = 0, 1, 2
+
+PAGE = '''<!DOCTYPE html>
+<html lang="uk">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>div[role="radio"] {{ cursor: pointer; }} div[aria-checked="true"] {{ font-weight: bold; }}</style>
+</head>
+<body>
+<form action="formResponse" method="POST" id="form">
+<input type="hidden" name="fbzx" value="{fbzx}">
+{items}
+<div role="button" id="submit"><span>Надіслати</span></div>
+</form>
+<script>
+// Як у Google Forms: вибір варіанта записується у приховане поле entry.<id>
+document.querySelectorAll('div[role="radio"]').forEach(function (option) {{
+    option.addEventListener('click', function () {{
+        var item = option.closest('div[role="listitem"]');
+        item.querySelectorAll('div[role="radio"]').forEach(function (el) {{ el.setAttribute('aria-checked', 'false'); }});
+        option.setAttribute('aria-checked', 'true');
+        item.querySelector('input[type="hidden"]').value = option.getAttribute('data-value');
+    }});
+}});
+document.getElementById('submit').addEventListener('click', function () {{
+    document.getElementById('form').submit();
+}});
+</script>
+<script>var FB_PUBLIC_LOAD_DATA_ = {load_data};</script>
+</body>
+</html>
+'''
+
+
+def _item_html(entry_id, title, kind, options):
+    heading = f'<div role="heading">{html.escape(title)}</div>'
+    name = f'entry.{entry_id}'
+    if kind == RADIO:
+        radios = ''.join(f'<div role="radio" aria-checked="false" aria-label="{html.escape(o)}" '
+                         f'data-value="{html.escape(o)}"><span>{html.escape(o)}</span></div>' for o in options)
+        field = f'<input type="hidden" name="{name}" value="">{radios}'
+    elif kind == PARAGRAPH:
+        field = f'<textarea name="{name}"></textarea>'
+    else:
+        field = f'<input type="text" name="{name}">'
+    return f'<div role="listitem">{heading}{field}</div>'
+
+
+def render_form(questions, title='Тестова форма', fbzx='-123456789'):
+    """
+    Сторінка у форматі Google Forms: блоки role="listitem" для браузера і FB_PUBLIC_LOAD_DATA_
+    для HTTP-рушія. questions — список (заголовок, тип, варіанти).
+    """
+    items, load_items = [], []
+    for number, (question, kind, options) in enumerate(questions, start=1):
+        entry_id = 1000 + number
+        items.append(_item_html(entry_id, question, kind, options))
+        load_items.append([number, question, None, kind, [[entry_id, [[o] for o in options] or None, 0]]])
+    load_data = json.dumps([None, [None, load_items]], ensure_ascii=False)
+    return PAGE.format(title=html.escape(title), fbzx=fbzx, items='\n'.join(items), load_data=load_data)
+
+
+def generated_questions(count):
+    """Велика форма: чергуються текстові питання і питання з варіантами."""
+    questions = []
+    for i in range(1, count + 1):
+        if i % 2:
+            questions.append((f'Питання номер {i}', TEXT, []))
+        else:
+            questions.append((f'Питання номер {i}', RADIO, ['Так', 'Ні', 'Не знаю']))
+    return questions
+
+
+class FormServer:
+    """
+    Локальний HTTP-сервер форми: віддає файли з tests/fixtures (та додані сторінки)
+    і записує кожну відправку на .../formResponse.
+    """
+
+    def __init__(self):
+        self.pages = {}
+        self.submissions = []
+        self.gets = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(SimpleHTTPRequestHandler):
+            # Як і Google, явно вказуємо кодування сторінки
+            extensions_map = {**SimpleHTTPRequestHandler.extensions_map, '.html': 'text/html; charset=utf-8'}
+
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, directory=FIXTURES_DIR, **kwargs)
+
+            def do_GET(self):
+                path = urlsplit(self.path).path
+                with server._lock:
+                    server.gets.append(path)
+                if path in server.pages:
+                    return self._send(server.pages[path])
+                return super().do_GET()
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+                if not urlsplit(self.path).path.endswith('/formResponse'):
+                    self.send_error(404)
+                    return
+                fields = {key: values[0] for key, values in parse_qs(body, keep_blank_values=True).items()}
+                with server._lock:
+                    server.submissions.append(fields)
+                self._send('<html><body><p>Вашу відповідь записано.</p></body></html>')
+
+            def _send(self, text):
+                body = text.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
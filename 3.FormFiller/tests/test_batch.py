@@ -0,0 +1,97 @@
+import csv
+
+import pytest
+import requests
+
+import http_engine
+from batch import BatchRunner, SubmitUncertain
+from http_engine import HttpFormFiller
+
+SCHEMA = {'action': 'https://example.com/formResponse', 'fbzx': '1', 'pages': 1,
+          'fields': {'ім\'я': {'name': 'entry.1', 'type': 'text', 'options': []}}}
+
+
+class StubFiller:
+    """Filler, що по черзі піднімає передані винятки, а потім відправляє успішно."""
+
+    def __init__(self, errors, calls):
+        self.errors = errors
+        self.calls = calls
+        self.last_timings = {}
+
+    def submit(self, answers):
+        self.calls.append(answers)
+        if self.errors:
+            raise self.errors.pop(0)
+        return []
+
+    def close(self):
+        pass
+
+
+def run_rows(tmp_path, errors, retries=2):
+    calls = []
+    runner = BatchRunner(lambda: StubFiller(errors, calls), workers=1, retries=retries)
+    report = tmp_path / 'report.csv'
+    counts = runner.run([(1, {'Ім\'я': 'Оля'})], str(report))
+    with open(report, encoding='utf-8', newline='') as f:
+        return counts, list(csv.DictReader(f)), calls
+
+
+def test_errors_before_submit_are_retried(tmp_path):
+    counts, rows, calls = run_rows(tmp_path, [RuntimeError("сторінка не завантажилась")])
+    assert counts == (1, 0, 0, 0)
+    assert rows[0]['status'] == 'ok' and rows[0]['attempts'] == '2'
+    assert len(calls) == 2
+
+
+def test_uncertain_submit_is_not_resent(tmp_path):
+    counts, rows, calls = run_rows(tmp_path, [SubmitUncertain("Немає підтвердження відправки")])
+    assert counts == (0, 0, 1, 0)
+    assert rows[0]['status'] == 'uncertain'
+    assert len(calls) == 1
+
+
+class TimeoutSession:
+    def __init__(self, error):
+        self.error = error
+
+    def post(self, *args, **kwargs):
+        raise self.error
+
+
+@pytest.mark.parametrize('error, expected', [
+    (requests.ReadTimeout("read timed out"), SubmitUncertain),
+    (requests.ConnectTimeout("connect timed out"), requests.ConnectTimeout),
+])
+def test_http_post_failures(monkeypatch, error, expected):
+    monkeypatch.setattr(http_engine, 'get_form_schema', lambda session, form_url: SCHEMA)
+    filler = HttpFormFiller('https://example.com/viewform', TimeoutSession(error))
+    with pytest.raises(expected):
+        filler.submit({'Ім\'я': 'Оля'})
+
+
+class RecordingSession:
+    def __init__(self):
+        self.posted = None
+
+    def post(self, url, data=None, timeout=None):
+        self.posted = data
+        return _ok_response()
+
+
+def _ok_response():
+    response = requests.Response()
+    response.status_code = 200
+    return response
+
+
+def test_http_option_matching_ignores_case(monkeypatch):
+    schema = {'action': 'https://example.com/formResponse', 'fbzx': '1', 'pages': 1,
+              'fields': {'стать': {'name': 'entry.2', 'type': 'radio', 'options': ['Жіноча', 'Чоловіча']}}}
+    monkeypatch.setattr(http_engine, 'get_form_schema', lambda session, form_url: schema)
+    session = RecordingSession()
+    missing = HttpFormFiller('https://example.com/viewform', session).submit({'Стать': ' жіноча '})
+    assert missing == []
+    # Google приймає лише точний текст варіанта з форми
+    assert session.posted['entry.2'] == 'Жіноча'
@@ -0,0 +1,128 @@
+import csv
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import textwrap
+
+from batch import BatchRunner
+from checkpoint import Checkpoint
+
+ROWS = 40
+# Після скількох відправок процес "падає" (os._exit, без finally і закриття файлів)
+KILL_AFTER = 15
+FORM_URL = 'https://example.com/viewform'
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Перший запуск в окремому процесі: stub-filler записує кожну відправку в sent.log
+# і вбиває процес одразу після KILL_AFTER-ї, ще до того, як її підтвердить журнал
+KILLED_RUN = textwrap.dedent('''
+    import os, sys, threading
+    sys.path.insert(0, {project!r})
+    from batch import BatchRunner
+    from checkpoint import Checkpoint
+
+    lock = threading.Lock()
+    sent = []
+
+    class KillingFiller:
+        last_timings = {{}}
+
+        def submit(self, answers):
+            with lock:
+                with open({log!r}, 'a') as f:
+                    f.write(answers['id'] + '\\n')
+                sent.append(answers['id'])
+                if len(sent) == {kill_after}:
+                    os._exit(1)
+            return []
+
+        def close(self):
+            pass
+
+    rows = ((n, {{'id': str(n)}}) for n in range(1, {rows} + 1))
+    BatchRunner(KillingFiller, workers=4, checkpoint=Checkpoint({db!r}, {url!r})).run(rows, {report!r})
+''')
+
+
+class LoggingFiller:
+    def __init__(self, log, lock):
+        self.log = log
+        self.lock = lock
+        self.last_timings = {}
+
+    def submit(self, answers):
+        with self.lock, open(self.log, 'a') as f:
+            f.write(answers['id'] + '\n')
+        return []
+
+    def close(self):
+        pass
+
+
+def test_resume_after_kill_has_no_duplicates_or_gaps(tmp_path):
+    log, db, report = str(tmp_path / 'sent.log'), str(tmp_path / 'rows.db'), str(tmp_path / 'report.csv')
+    script = KILLED_RUN.format(project=PROJECT_DIR, log=log, db=db, url=FORM_URL, report=report,
+                               rows=ROWS, kill_after=KILL_AFTER)
+    killed = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True)
+    assert killed.returncode == 1, killed.stderr
+
+    lock = threading.Lock()
+    checkpoint = Checkpoint(db, FORM_URL)
+    runner = BatchRunner(lambda: LoggingFiller(log, lock), workers=4, checkpoint=checkpoint)
+    ok, failed, uncertain, skipped = runner.run(((n, {'id': str(n)}) for n in range(1, ROWS + 1)), report)
+    checkpoint.close()
+
+    with open(log) as f:
+        sent = [int(line) for line in f]
+    with open(report, encoding='utf-8', newline='') as f:
+        reported_uncertain = {int(r['row']) for r in csv.DictReader(f) if r['status'] == 'uncertain'}
+
+    # Жоден рядок не відправлено двічі
+    assert len(sent) == len(set(sent))
+    # Рядок, відправлений перед падінням, але не підтверджений, не повторюється, а потрапляє у звіт
+    assert sent[KILL_AFTER - 1] in reported_uncertain
+    # Жоден рядок не загубився: кожен або відправлено, або явно позначено як невизначений
+    assert set(sent) | reported_uncertain == set(range(1, ROWS + 1))
+    assert failed == 0 and uncertain == len(reported_uncertain)
+    assert ok + uncertain + skipped == ROWS
+
+
+def test_resubmit_uncertain_sends_interrupted_rows_again(tmp_path):
+    db = str(tmp_path / 'rows.db')
+    checkpoint = Checkpoint(db, FORM_URL)
+    checkpoint.mark_done(1)
+    checkpoint.mark_started(2)
+    log, lock = str(tmp_path / 'sent.log'), threading.Lock()
+    runner = BatchRunner(lambda: LoggingFiller(log, lock), workers=1, checkpoint=checkpoint,
+                         resubmit_uncertain=True)
+    assert runner.run([(1, {'id': '1'}), (2, {'id': '2'})], str(tmp_path / 'report.csv')) == (1, 0, 0, 1)
+    assert checkpoint.status(2) == 'done'
+    checkpoint.close()
+
+
+class FlakyCheckpoint(Checkpoint):
+    """Журнал, що не може підтвердити відправку (наприклад, база заблокована)."""
+
+    def mark_done(self, row_number):
+        raise sqlite3.OperationalError("database is locked")
+
+
+def test_journal_failure_after_submit_is_not_resent(tmp_path):
+    checkpoint = FlakyCheckpoint(str(tmp_path / 'rows.db'), FORM_URL)
+    log, lock = str(tmp_path / 'sent.log'), threading.Lock()
+    runner = BatchRunner(lambda: LoggingFiller(log, lock), workers=1, checkpoint=checkpoint)
+    report = str(tmp_path / 'report.csv')
+    assert runner.run([(1, {'id': '1'})], report) == (0, 0, 1, 0)
+    with open(log) as f:
+        assert f.read().split() == ['1']
+    with open(report, encoding='utf-8', newline='') as f:
+        assert [r['status'] for r in csv.DictReader(f)] == ['uncertain']
+
+    # Продовження теж не відправляє рядок удруге
+    runner = BatchRunner(lambda: LoggingFiller(log, lock), workers=1, checkpoint=checkpoint)
+    assert runner.run([(1, {'id': '1'})], report) == (0, 0, 1, 0)
+    with open(log) as f:
+        assert f.read().split() == ['1']
+    checkpoint.close()
@@ -0,0 +1,71 @@
+import csv
+import os
+
+import pytest
+
+from batch import BatchRunner, read_submissions
+from checkpoint import Checkpoint
+from form_fixture import FIXTURES_DIR
+from http_engine import HttpFormFiller, UnsupportedForm, make_session
+
+ROWS = 40
+ANSWERS = ['3', '4', '5']
+
+
+def write_rows(path, count):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Ваше ім'я", 'Скільки буде 2+2', 'Улюблений колір', 'Коментар'])
+        for i in range(1, count + 1):
+            writer.writerow([f'Користувач {i}', ANSWERS[i % 3], f'колір {i}', f'коментар {i}'])
+
+
+def read_report(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def assert_rows_submitted(submissions, count):
+    by_name = {s['entry.1001']: s for s in submissions}
+    assert len(submissions) == len(by_name) == count
+    for i in range(1, count + 1):
+        sent = by_name[f'Користувач {i}']
+        assert sent['entry.1002'] == ANSWERS[i % 3]
+        assert sent['entry.1003'] == f'колір {i}'
+        assert sent['entry.1004'] == f'коментар {i}'
+
+
+def test_http_batch_against_static_fixture(form_server, tmp_path):
+    rows, report = tmp_path / 'rows.csv', tmp_path / 'report.csv'
+    write_rows(rows, ROWS)
+    session = make_session(4)
+    checkpoint = Checkpoint(str(tmp_path / 'rows.db'), form_server.url + '/form.html')
+    runner = BatchRunner(lambda: HttpFormFiller(form_server.url + '/form.html', session), workers=4,
+                         checkpoint=checkpoint)
+
+    assert runner.run(read_submissions(str(rows)), str(report)) == (ROWS, 0, 0, 0)
+    # Повторний запуск нічого не відправляє: усі рядки вже в журналі
+    assert runner.run(read_submissions(str(rows)), str(report)) == (0, 0, 0, ROWS)
+    checkpoint.close()
+    session.close()
+
+    assert_rows_submitted(form_server.submissions, ROWS)
+    assert {r['status'] for r in read_report(report)} == {'ok'}
+
+
+def test_local_file_goes_to_the_browser(form_main):
+    # Шлях до файлу стає file:// URI; HTTP-рушій його не відправляє, тож auto перейде на браузер
+    url = form_main.form_url_from_arg(os.path.join(FIXTURES_DIR, 'form.html'))
+    assert url.startswith('file://') and url.endswith('/form.html')
+    with pytest.raises(UnsupportedForm):
+        HttpFormFiller(url, make_session(1)).submit({"Ваше ім'я": 'Оля'})
+
+
+def test_browser_batch_against_static_fixture(form_server, browser_factory, tmp_path):
+    rows, report = tmp_path / 'rows.csv', tmp_path / 'report.csv'
+    write_rows(rows, 6)
+    runner = BatchRunner(browser_factory(form_server.url + '/form.html'), workers=2)
+
+    assert runner.run(read_submissions(str(rows)), str(report)) == (6, 0, 0, 0)
+    assert_rows_submitted(form_server.submissions, 6)
+    assert all(r['missing'] == '' for r in read_report(report))
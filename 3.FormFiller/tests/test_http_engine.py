@@ -0,0 +1,46 @@
+import pytest
+
+from http_engine import HttpFormFiller, UnsupportedForm, get_form_schema, make_session, parse_form
+
+
+def test_parse_form_maps_headings_to_entries(form_server):
+    session = make_session(1)
+    schema = get_form_schema(session, form_server.url + '/form.html')
+
+    assert schema['action'] == form_server.url + '/formResponse'
+    assert schema['fbzx'] == '-123456789'
+    assert schema['fields'] == {
+        "ваше ім'я": {'name': 'entry.1001', 'type': 'text', 'options': []},
+        'скільки буде 2+2': {'name': 'entry.1002', 'type': 'radio', 'options': ['3', '4', '5']},
+        'улюблений колір': {'name': 'entry.1003', 'type': 'text', 'options': []},
+        'коментар': {'name': 'entry.1004', 'type': 'text', 'options': []},
+    }
+
+
+def test_submissions_post_entries_and_reuse_the_schema(form_server):
+    session = make_session(2)
+    filler = HttpFormFiller(form_server.url + '/form.html', session)
+
+    missing = filler.submit({"Ваше ім'я": 'Оля', 'Скільки буде 2+2': '4', 'Улюблений колір': 'синій',
+                             'Номер телефону': '123'})
+    filler.submit({"ваше ім'я": 'Петро', 'Скільки буде 2+2': '5', 'Коментар': 'Рядок один'})
+
+    assert missing == ['Номер телефону']
+    first, second = form_server.submissions
+    assert first == {'fvv': '1', 'fbzx': '-123456789', 'pageHistory': '0', 'entry.1001': 'Оля',
+                     'entry.1002': '4', 'entry.1003': 'синій'}
+    assert second['entry.1001'] == 'Петро' and second['entry.1004'] == 'Рядок один'
+    # Сторінка форми завантажується й розбирається один раз для URL
+    assert form_server.gets.count('/form.html') == 1
+    assert set(filler.last_timings) == {'schema', 'post'}
+
+
+def test_unknown_option_is_reported_missing(form_server):
+    filler = HttpFormFiller(form_server.url + '/form.html', make_session(1))
+    assert filler.submit({'Скільки буде 2+2': '22'}) == ['Скільки буде 2+2']
+    assert 'entry.1002' not in form_server.submissions[0]
+
+
+def test_parse_form_without_load_data_is_unsupported():
+    with pytest.raises(UnsupportedForm):
+        parse_form('<html><form action="formResponse"></form></html>', 'http://127.0.0.1/form.html')
@@ -0,0 +1,80 @@
+import time
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+
+from form_fixture import RADIO, generated_questions, render_form
+from http_engine import get_form_schema, make_session
+from matching import find_field
+
+QUESTIONS = 200
+
+
+def answers_for(questions):
+    return {question: ('Так' if kind == RADIO else f'відповідь {i}')
+            for i, (question, kind, _) in enumerate(questions)}
+
+
+def try_fill_text(driver, question_text, answer_text):
+    """Попередній підхід: окремий XPath-пошук по всьому документу для кожного питання."""
+    container_xpath = f"//div[@role='listitem'][.//div[@role='heading'][contains(., '{question_text}')]]"
+    elements = driver.find_elements(By.XPATH, f"{container_xpath}//input | {container_xpath}//textarea")
+    if elements and elements[0].is_displayed():
+        elements[0].clear()
+        elements[0].send_keys(answer_text)
+        return True
+    return False
+
+
+def try_select_radio(driver, question_text, option_text):
+    container_xpath = f"//div[@role='listitem'][.//div[@role='heading'][contains(., '{question_text}')]]"
+    option_xpath = (f"{container_xpath}//div[@role='radio' and @aria-label='{option_text}'] | "
+                    f"{container_xpath}//span[text()='{option_text}']")
+    elements = driver.find_elements(By.XPATH, option_xpath)
+    if elements:
+        driver.execute_script("arguments[0].scrollIntoView(true);", elements[0])
+        elements[0].click()
+        return True
+    return False
+
+
+def load(filler, url):
+    filler.driver.get(url)
+    filler.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'div[role="listitem"]')))
+
+
+def test_generated_form_fixture(form_server):
+    # Фікстура має коректну схему: усі 200 питань знаходить і HTTP-рушій
+    questions = generated_questions(QUESTIONS)
+    form_server.pages['/form200.html'] = render_form(questions)
+    schema = get_form_schema(make_session(1), form_server.url + '/form200.html')
+    assert len(schema['fields']) == QUESTIONS
+    assert all(find_field(schema['fields'], question) for question, _, _ in questions)
+
+
+def test_one_pass_index_vs_xpath_per_question(form_server, browser_factory):
+    questions = generated_questions(QUESTIONS)
+    answers = answers_for(questions)
+    form_server.pages['/form200.html'] = render_form(questions)
+    url = form_server.url + '/form200.html'
+    filler = browser_factory(url)()
+    try:
+        load(filler, url)
+        start = time.perf_counter()
+        missing_xpath = [q for q, a in answers.items()
+                         if not try_fill_text(filler.driver, q, a) and not try_select_radio(filler.driver, q, a)]
+        xpath_seconds = time.perf_counter() - start
+
+        load(filler, url)
+        start = time.perf_counter()
+        index = filler._build_index()
+        missing_index = [q for q, a in answers.items()
+                         if not (field := find_field(index, q)) or not filler._fill_field(field, a)]
+        index_seconds = time.perf_counter() - start
+    finally:
+        filler.close()
+
+    print(f"\n{QUESTIONS} питань: XPath на кожне питання {xpath_seconds:.2f} с, "
+          f"індекс за один прохід {index_seconds:.2f} с ({xpath_seconds / index_seconds:.1f}x)")
+    assert missing_xpath == [] and missing_index == []
+    assert index_seconds < xpath_seconds